@@ -0,0 +1,222 @@
+# anomaly.py - Аномалии относительно истории самой собаки и когорты клиники
+#
+#   python anomaly.py clinic/ --days 30            - аномалии по всем пациентам
+#
+# Оценки устойчивые (медиана/MAD), z-оценка по Иглевичу-Хоглину:
+#   z_patient - относительно медианы всей истории собаки;
+#   z_rolling - относительно предыдущих WINDOW значений (резкий скачок);
+#   z_cohort  - относительно всех значений показателя в клинике.
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# MAD → оценка SD для нормального распределения
+MAD_SCALE = 1.4826
+Z_THRESHOLD = 3.5
+WINDOW = 20
+MIN_PERIODS = 10
+
+Z_COLUMNS = ('z_patient', 'z_rolling', 'z_cohort')
+REASONS = {
+    'z_patient': 'выше/ниже своей медианы',
+    'z_rolling': 'резкий скачок',
+    'z_cohort': 'необычно для клиники',
+}
+
+
+def robust_z(values, median, mad):
+    """(x - медиана) / MAD; NaN, где разброса нет"""
+    values = np.asarray(values, dtype=float)
+    mad = np.asarray(mad, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mad > 0, (values - median) / mad, np.nan)
+
+
+def rolling_z(values, positions, window=WINDOW, min_periods=MIN_PERIODS, floor=None):
+    """z-оценка каждого значения по предыдущим window значениям той же серии
+
+    values отсортированы по сериям (пациент, показатель) и датам, positions -
+    номер значения внутри своей серии. Окна строятся одним массивом
+    (sliding_window_view), значения чужих серий маскируются. floor - нижняя
+    граница разброса для каждого значения (MAD всей истории пациента):
+    MAD короткого окна сильно шумит и на спокойном участке почти нулевой.
+    """
+    values = np.asarray(values, dtype=float)
+    positions = np.asarray(positions)
+    if len(values) == 0:
+        return np.empty(0)
+    padded = np.concatenate((np.full(window, np.nan), values))
+    windows = sliding_window_view(padded[:-1], window)
+    # Элемент j окна - значение на (window - j) позиций раньше текущего
+    lags = window - np.arange(window)
+    windows = np.where(lags[None, :] <= positions[:, None], windows, np.nan)
+
+    counts = np.minimum(positions, window)
+    enough = counts >= min_periods
+    result = np.full(len(values), np.nan)
+    if enough.any():
+        sample = windows[enough]
+        median = np.nanmedian(sample, axis=1)
+        mad = np.nanmedian(np.abs(sample - median[:, None]), axis=1) * MAD_SCALE
+        if floor is not None:
+            mad = np.fmax(mad, np.asarray(floor, dtype=float)[enough])
+        result[enough] = robust_z(values[enough], median, mad)
+    return result
+
+
+def cohort_stats(observations):
+    """Медиана и MAD каждого показателя по всем значениям: {показатель: (медиана, MAD)}"""
+    if len(observations) == 0:
+        return {}
+    groups = observations.groupby('metric')['value']
+    median = groups.median()
+    deviation = (observations['value'] - observations['metric'].map(median)).abs()
+    mad = deviation.groupby(observations['metric']).median() * MAD_SCALE
+    return {metric: (median[metric], mad[metric]) for metric in median.index}
+
+
+def to_observations(df, patient_id=None):
+    """Таблица измерений → длинный формат (patient_id, date, metric, value)"""
+    metrics = [col for col in df.columns if col != 'date']
+    long_df = df.melt(id_vars='date', value_vars=metrics, var_name='metric').dropna(subset=['value'])
+    long_df.insert(0, 'patient_id', patient_id)
+    return long_df.reset_index(drop=True)
+
+
+def score_observations(observations, cohort=None, window=WINDOW, min_periods=MIN_PERIODS):
+    """Устойчивые z-оценки для всех значений сразу (без циклов по пациентам)
+
+    observations - patient_id, date, metric, value; cohort - готовая статистика
+    когорты (по умолчанию - по самим observations).
+    """
+    scored = observations.sort_values(['patient_id', 'metric', 'date'], kind='stable', ignore_index=True)
+    values = scored['value'].to_numpy(dtype=float)
+    keys = [scored['patient_id'], scored['metric']]
+
+    median = scored.groupby(keys, sort=False, dropna=False)['value'].transform('median').to_numpy()
+    deviation = pd.Series(np.abs(values - median), index=scored.index)
+    mad = deviation.groupby(keys, sort=False, dropna=False).transform('median').to_numpy() * MAD_SCALE
+    scored['median'] = median
+    scored['z_patient'] = robust_z(values, median, mad)
+
+    positions = scored.groupby(keys, sort=False, dropna=False).cumcount().to_numpy()
+    scored['z_rolling'] = rolling_z(values, positions, window, min_periods, floor=mad)
+
+    if cohort is None:
+        cohort = cohort_stats(scored)
+    cohort_median = scored['metric'].map({m: s[0] for m, s in cohort.items()}).to_numpy(dtype=float)
+    cohort_mad = scored['metric'].map({m: s[1] for m, s in cohort.items()}).to_numpy(dtype=float)
+    scored['z_cohort'] = robust_z(values, cohort_median, cohort_mad)
+    return scored
+
+
+def flag_anomalies(scored, threshold=Z_THRESHOLD):
+    """Строки, где хотя бы одна |z| выше порога, с пояснением"""
+    z = np.abs(scored[list(Z_COLUMNS)].to_numpy(dtype=float))
+    with np.errstate(invalid='ignore'):
+        hits = z > threshold
+    anomalies = scored[hits.any(axis=1)].copy()
+    hits = hits[hits.any(axis=1)]
+    anomalies['reason'] = [
+        ', '.join(REASONS[column] for column, hit in zip(Z_COLUMNS, row) if hit)
+        for row in hits
+    ]
+    return anomalies.sort_values(['date', 'patient_id'], kind='stable', ignore_index=True)
+
+
+class AnomalyDetector:
+    """Аномалии одной собаки: оценка всей истории и новых строк по мере записи
+
+    Медиана/MAD истории фиксируются при построении (fit), для скользящей
+    оценки хранятся последние WINDOW значений каждого показателя - новые
+    строки оцениваются за O(новых строк).
+    """
+
+    def __init__(self, cohort=None, window=WINDOW, min_periods=MIN_PERIODS, threshold=Z_THRESHOLD):
+        self.cohort = cohort or {}
+        self.window = window
+        self.min_periods = min_periods
+        self.threshold = threshold
+        self.baseline = {}
+        self.tails = {}
+
+    def fit(self, df):
+        """Оценить всю историю; возвращает найденные аномалии"""
+        scored = score_observations(to_observations(df), self.cohort, self.window, self.min_periods)
+        self.baseline = {}
+        self.tails = {}
+        for metric, group in scored.groupby('metric', sort=False):
+            values = group['value'].to_numpy(dtype=float)
+            median = float(np.median(values))
+            self.baseline[metric] = (median, float(np.median(np.abs(values - median))) * MAD_SCALE)
+            self.tails[metric] = values[-self.window:]
+        return flag_anomalies(scored, self.threshold)
+
+    def score_appended(self, df):
+        """Оценить новые строки (после уже учтенных) и запомнить их в окнах"""
+        new = to_observations(df).sort_values(['metric', 'date'], kind='stable', ignore_index=True)
+        if len(new) == 0:
+            return flag_anomalies(new.assign(**{column: np.nan for column in Z_COLUMNS}))
+
+        # Хвосты истории + новые значения - одна последовательность на показатель
+        metrics = new['metric'].to_numpy()
+        tails = [self.tails.get(metric, np.empty(0)) for metric in pd.unique(metrics)]
+        history = pd.DataFrame({
+            'metric': np.repeat(pd.unique(metrics), [len(tail) for tail in tails]),
+            'value': np.concatenate(tails) if tails else np.empty(0),
+        })
+        sequence = pd.concat([history, new[['metric', 'value']]], ignore_index=True)
+        sequence['is_new'] = np.arange(len(sequence)) >= len(history)
+        sequence = sequence.sort_values('metric', kind='stable', ignore_index=True)
+        positions = sequence.groupby('metric', sort=False).cumcount().to_numpy()
+        floor = sequence['metric'].map({metric: stats[1] for metric, stats in self.baseline.items()})
+        z_rolling = rolling_z(sequence['value'], positions, self.window, self.min_periods,
+                              floor=floor.to_numpy(dtype=float))
+        new['z_rolling'] = z_rolling[sequence['is_new'].to_numpy()]
+
+        values = new['value'].to_numpy(dtype=float)
+        baseline = [self.baseline.get(metric, (np.nan, np.nan)) for metric in metrics]
+        new['median'] = [stats[0] for stats in baseline]
+        new['z_patient'] = robust_z(values, new['median'], [stats[1] for stats in baseline])
+        cohort = [self.cohort.get(metric, (np.nan, np.nan)) for metric in metrics]
+        new['z_cohort'] = robust_z(values, [stats[0] for stats in cohort], [stats[1] for stats in cohort])
+
+        for metric, group in new.groupby('metric', sort=False):
+            tail = np.concatenate((self.tails.get(metric, np.empty(0)), group['value'].to_numpy(dtype=float)))
+            self.tails[metric] = tail[-self.window:]
+        return flag_anomalies(new, self.threshold)
+
+
+def scan_clinic(store, since=None, threshold=Z_THRESHOLD):
+    """Аномалии всех пациентов клиники по индексу наблюдений (один проход)"""
+    observations = store.observations()
+    scored = score_observations(observations)
+    anomalies = flag_anomalies(scored, threshold)
+    if since is not None:
+        anomalies = anomalies[anomalies['date'] >= pd.Timestamp(since)].reset_index(drop=True)
+    return anomalies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Аномалии показателей по всем пациентам клиники")
+    parser.add_argument('root', help='каталог хранилища клиники')
+    parser.add_argument('--days', type=int, help='только за последние N дней')
+    parser.add_argument('--threshold', type=float, default=Z_THRESHOLD)
+    args = parser.parse_args()
+
+    from patient_store import PatientStore
+    store = PatientStore(args.root)
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    anomalies = scan_clinic(store, since=since, threshold=args.threshold)
+    if len(anomalies) == 0:
+        print("✅ Аномалий не найдено")
+    else:
+        pd.set_option('display.max_rows', None)
+        pd.set_option('display.width', None)
+        pd.set_option('display.precision', 2)
+        columns = ['patient_id', 'date', 'metric', 'value', 'median', *Z_COLUMNS, 'reason']
+        print(anomalies[columns])
+        print(f"\n🚨 Аномалий: {len(anomalies)}, пациентов: {anomalies['patient_id'].nunique()}")
@@ -0,0 +1,206 @@
+# batch_report.py - Отчеты по всем пациентам без диалога, параллельно по процессам
+#
+#   python batch_report.py data/ rex.xlsx --out reports --workers 4
+#   python batch_report.py --store clinic/ --out reports
+#
+# Для каждого пациента в <out>/<имя>/ пишутся analysis.txt (анализ ХБП и
+# proteinuria), key_metrics.txt и dashboard.png. В <out>/manifest.json
+# запоминается отпечаток данных: пациенты, чьи данные не менялись, пропускаются.
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+# Смена формата отчета - повод пересобрать все отчеты
+REPORT_VERSION = 1
+DATA_EXTENSIONS = ('.xlsx', '.db', '.sqlite', '.sqlite3')
+REPORT_FILES = ('analysis.txt', 'key_metrics.txt', 'dashboard.png')
+MANIFEST = 'manifest.json'
+
+
+def find_data_files(paths):
+    """Файлы данных из списка путей (каталоги - без вложенных)"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            # Временные файлы атомарной записи и блокировки Excel пропускаем
+            if (os.path.isfile(full) and name.lower().endswith(DATA_EXTENSIONS)
+                    and '.tmp.' not in name and not name.startswith('~$')):
+                files.append(full)
+    return files
+
+
+def fingerprint(data_file):
+    """Отпечаток данных: mtime и размер файла и его журнала"""
+    stamp = [REPORT_VERSION]
+    for path in (data_file, data_file + '.journal'):
+        try:
+            stat = os.stat(path)
+            stamp.append([stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            stamp.append(None)
+    return stamp
+
+
+def file_jobs(files):
+    """Задания по файлам данных; имя отчета - имя файла без расширения"""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in files]
+    jobs = []
+    for path, stem in zip(files, stems):
+        name = stem if stems.count(stem) == 1 else os.path.basename(path)
+        jobs.append({'name': name, 'data_file': path})
+    return jobs
+
+
+def store_jobs(root):
+    """Задания по всем пациентам хранилища клиники"""
+    from patient_store import PatientStore
+    store = PatientStore(root)
+    jobs = []
+    for patient_id in store.patients()['patient_id']:
+        jobs.append({
+            'name': re.sub(r'[^\w.-]', '_', patient_id),
+            'store': root,
+            'patient_id': patient_id,
+            'data_file': store.shard_path(patient_id),
+        })
+    store.close()
+    return jobs
+
+
+def _capture(func, *args, **kwargs):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        func(*args, **kwargs)
+    return out.getvalue()
+
+
+def build_report(job, out_dir):
+    """Отчет одного пациента (выполняется в процессе пула)"""
+    from medical_tracker import DogMedicalTracker
+
+    target = os.path.join(out_dir, job['name'])
+    os.makedirs(target, exist_ok=True)
+
+    store = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        if 'patient_id' in job:
+            from patient_store import PatientStore
+            store = PatientStore(job['store'])
+            tracker = store.tracker(job['patient_id'])
+        else:
+            tracker = DogMedicalTracker(job['data_file'])
+    # Загрузка могла перенести журнал в хранилище - отпечаток снимаем после нее
+    stamp = fingerprint(tracker.data_file)
+
+    # В файле таблицы не обрезаются по ширине терминала
+    with pd.option_context('display.max_columns', None, 'display.width', None):
+        analysis = _capture(tracker.show_ckd_analysis) + _capture(tracker.show_proteinuria_analysis)
+        key_metrics = _capture(tracker.show_key_metrics_table)
+    with open(os.path.join(target, 'analysis.txt'), 'w', encoding='utf-8') as f:
+        f.write(analysis)
+    with open(os.path.join(target, 'key_metrics.txt'), 'w', encoding='utf-8') as f:
+        f.write(key_metrics)
+    if len(tracker.df) > 0:
+        _capture(tracker.plot_proteinuria_dashboard,
+                 output_path=os.path.join(target, 'dashboard.png'), use_cache=False)
+
+    rows = len(tracker.df)
+    if hasattr(tracker.storage, 'close'):
+        tracker.storage.close()
+    if store is not None:
+        store.close()
+    return {'fingerprint': stamp, 'rows': rows}
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(job, manifest, out_dir):
+    entry = manifest.get(job['name'])
+    if entry is None or entry.get('fingerprint') != fingerprint(job['data_file']):
+        return False
+    target = os.path.join(out_dir, job['name'])
+    # Дашборда нет у пустой истории
+    needed = REPORT_FILES if entry.get('rows') else REPORT_FILES[:2]
+    return all(os.path.exists(os.path.join(target, name)) for name in needed)
+
+
+def run_batch(jobs, out_dir, workers=None, force=False):
+    """Собрать отчеты; возвращает (собрано, пропущено, ошибок)"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    todo = [job for job in jobs if force or not is_up_to_date(job, manifest, out_dir)]
+    skipped = len(jobs) - len(todo)
+    if skipped:
+        print(f"⏭️  Без изменений, пропущено: {skipped}")
+
+    done = failed = 0
+    if not todo:
+        return done, skipped, failed
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_report, job, out_dir): job for job in todo}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                failed += 1
+                print(f"❌ {job['name']}: {error}")
+                continue
+            done += 1
+            manifest[job['name']] = {
+                'data_file': job['data_file'],
+                'fingerprint': result['fingerprint'],
+                'rows': result['rows'],
+                'generated': datetime.now().isoformat(timespec='seconds'),
+            }
+            # Манифест обновляется после каждого отчета - прерванный прогон не теряет работу
+            save_manifest(out_dir, manifest)
+            print(f"✅ {job['name']}: {result['rows']} записей")
+    return done, skipped, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчеты по всем пациентам")
+    parser.add_argument('paths', nargs='*', help='файлы данных или каталоги с ними')
+    parser.add_argument('--store', help='каталог хранилища клиники (все пациенты)')
+    parser.add_argument('--out', default='reports', help='каталог отчетов')
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию - по числу ядер)')
+    parser.add_argument('--force', action='store_true', help='пересобрать все отчеты')
+    args = parser.parse_args()
+
+    jobs = file_jobs(find_data_files(args.paths))
+    if args.store:
+        jobs += store_jobs(args.store)
+    if not jobs:
+        parser.error('не найдено ни одного файла данных')
+
+    done, skipped, failed = run_batch(jobs, args.out, args.workers, args.force)
+    print(f"\n📊 Собрано: {done}, пропущено: {skipped}, ошибок: {failed}")
@@ -0,0 +1,200 @@
+# benchmark.py - Нагрузочные замеры трекера на синтетической истории
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from medical_tracker import DogMedicalTracker
+
+# Показатели с ростом при прогрессировании ХБП: доля нормы за год
+CKD_DRIFT = {
+    'Creatinine_blood': 0.45,
+    'SDMA': 0.40,
+    'Urea': 0.35,
+    'Phosphorus': 0.20,
+}
+
+OPERATIONS = (
+    'load_data', 'save_data', 'append', 'show_transposed_table',
+    'show_ckd_analysis', 'show_proteinuria_analysis', 'dashboard',
+)
+
+
+def generate_history(reference_ranges, visits, seed=0, start='2018-01-01', ckd=True):
+    """Синтетическая история одной собаки по всем показателям reference_ranges
+
+    Значения - нормальный шум вокруг середины референса, почечные показатели
+    (CKD_DRIFT) медленно растут, часть панелей сдается без анализа мочи.
+    """
+    rng = np.random.default_rng(seed)
+    gaps = rng.integers(7, 45, size=visits)
+    dates = pd.Timestamp(start) + pd.to_timedelta(np.cumsum(gaps) - gaps[0], unit='D')
+    years = (dates - dates[0]).days.to_numpy() / 365.0
+
+    data = {'date': dates}
+    for metric, (low, high) in reference_ranges.items():
+        if high == low:
+            # Глюкоза/цилиндры: обычно 0, изредка находка
+            data[metric] = np.where(rng.random(visits) < 0.05, 1.0, 0.0)
+            continue
+        mid, spread = (low + high) / 2, (high - low) / 6
+        values = rng.normal(mid, spread, size=visits)
+        if ckd and metric in CKD_DRIFT:
+            values += high * CKD_DRIFT[metric] * years
+        data[metric] = np.clip(values, 0, None).round(3)
+
+    df = pd.DataFrame(data)
+
+    # Мочу сдают не каждый визит, UPC - из белка и креатинина мочи
+    no_urine = rng.random(visits) < 0.3
+    urine = ['USG', 'Protein_urine', 'Creatinine_urine', 'Leukocytes_urine', 'Glucose_urine', 'Casts']
+    df.loc[no_urine, [m for m in urine if m in df.columns]] = np.nan
+    if 'UPC_ratio' in df.columns:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df['UPC_ratio'] = (df['Protein_urine'] / df['Creatinine_urine']).round(3)
+    return df
+
+
+def generate_clinic(reference_ranges, patients, visits, seed=0):
+    """Истории нескольких собак: {patient_id: DataFrame}"""
+    return {
+        f'dog-{i:05d}': generate_history(reference_ranges, visits, seed=seed + i)
+        for i in range(patients)
+    }
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_patient(history, workdir, backend, repeat):
+    """Замеры всех операций для одной истории: {операция: [секунды]}"""
+    path = os.path.join(workdir, f'bench.{backend}')
+    tracker = DogMedicalTracker(path)
+    tracker.df = history
+    results = {}
+
+    results['save_data'] = _timed(tracker.save_data, repeat)
+    results['load_data'] = _timed(tracker.load_data, repeat)
+
+    # Неинтерактивное добавление одной панели (путь add_measurement без input)
+    last = tracker.df.iloc[-1].to_dict()
+    def append_one():
+        last['date'] = last['date'] + pd.Timedelta(days=14)
+        tracker.append_measurements([last], verbose=False)
+    results['append'] = _timed(append_one, repeat)
+
+    results['show_transposed_table'] = _timed(tracker.show_transposed_table, repeat)
+    results['show_ckd_analysis'] = _timed(tracker.show_ckd_analysis, repeat)
+    results['show_proteinuria_analysis'] = _timed(tracker.show_proteinuria_analysis, repeat)
+
+    image = os.path.join(workdir, 'dashboard.png')
+    results['dashboard'] = _timed(
+        lambda: tracker.plot_proteinuria_dashboard(output_path=image, use_cache=False), repeat)
+
+    if hasattr(tracker.storage, 'close'):
+        tracker.storage.close()
+    return results
+
+
+def run_benchmarks(sizes, patients=1, backend='db', repeat=3, seed=0):
+    """Прогон по размерам истории; возвращает список записей для JSON"""
+    reference_ranges = _reference_ranges()
+    records = []
+    for visits in sizes:
+        clinic = generate_clinic(reference_ranges, patients, visits, seed=seed)
+        per_op = {op: [] for op in OPERATIONS}
+        for history in clinic.values():
+            with tempfile.TemporaryDirectory() as workdir:
+                # Вывод таблиц и сообщений трекера в замеры не попадает
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings = bench_patient(history, workdir, backend, repeat)
+            for op, values in timings.items():
+                per_op[op].extend(values)
+
+        for op in OPERATIONS:
+            values = per_op[op]
+            records.append({
+                'operation': op,
+                'visits': visits,
+                'patients': patients,
+                'backend': backend,
+                'runs': len(values),
+                'mean_s': statistics.fmean(values),
+                'median_s': statistics.median(values),
+                'min_s': min(values),
+                'max_s': max(values),
+            })
+            print(f"{op:<28}{visits:>8}{statistics.median(values) * 1000:>14.2f} мс")
+    return records
+
+
+def _reference_ranges():
+    """Референсы трекера без загрузки данных"""
+    with tempfile.TemporaryDirectory() as workdir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker = DogMedicalTracker(os.path.join(workdir, 'empty.db'))
+        ranges = dict(tracker.reference_ranges)
+        tracker.storage.close()
+    return ranges
+
+
+def compare(current, previous_path):
+    """Отношение медиан к предыдущему прогону (>1 - стало медленнее)"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    baseline = {
+        (r['operation'], r['visits'], r['patients'], r['backend']): r['median_s']
+        for r in previous['results']
+    }
+    print("\n📊 СРАВНЕНИЕ С ПРЕДЫДУЩИМ ПРОГОНОМ")
+    for r in current:
+        key = (r['operation'], r['visits'], r['patients'], r['backend'])
+        if key in baseline and baseline[key] > 0:
+            ratio = r['median_s'] / baseline[key]
+            mark = "🐢" if ratio > 1.2 else ("🚀" if ratio < 0.8 else "  ")
+            print(f"{mark} {r['operation']:<28}{r['visits']:>8}  ×{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочные замеры трекера")
+    parser.add_argument('--sizes', default='100,1000,5000', help='число визитов через запятую')
+    parser.add_argument('--patients', type=int, default=1)
+    parser.add_argument('--backend', choices=('db', 'xlsx'), default='db')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', metavar='JSON', help='предыдущий файл результатов')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"{'Операция':<28}{'Визитов':>8}{'Медиана':>17}")
+    records = run_benchmarks(sizes, args.patients, args.backend, args.repeat, args.seed)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': records,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Результаты: {args.output}")
+
+    if args.compare:
+        compare(records, args.compare)
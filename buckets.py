@@ -0,0 +1,112 @@
+# buckets.py - Помесячные и поквартальные агрегаты показателей
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = {'M': 'месяцам', 'Q': 'кварталам'}
+
+
+def period_codes(dates, freq='M'):
+    """Номер периода для дат: месяцы (или кварталы) от января 1970"""
+    months = np.asarray(dates, dtype='datetime64[M]').astype(np.int64)
+    return months if freq == 'M' else np.floor_divide(months, 3)
+
+
+def period_label(code, freq='M'):
+    if freq == 'M':
+        year, month = divmod(int(code), 12)
+        return f'{1970 + year}-{month + 1:02d}'
+    year, quarter = divmod(int(code), 4)
+    return f'{1970 + year}-Q{quarter + 1}'
+
+
+class TimeBuckets:
+    """Агрегаты (число, сумма, минимум, максимум) по периодам × показателям
+
+    Периоды - отсортированный массив номеров; новые строки раскладываются
+    по периодам группировкой (np.add.at / np.minimum.at) за O(новых строк),
+    порядок дат для агрегатов не важен. Сводка за диапазон дат - бинарный
+    поиск по номерам периодов.
+    """
+
+    def __init__(self, metrics, freq='M'):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Неизвестная частота: {freq}")
+        self.metrics = list(metrics)
+        self.freq = freq
+        self._positions = {metric: j for j, metric in enumerate(self.metrics)}
+        self.reset()
+
+    @classmethod
+    def from_frame(cls, df, freq='M'):
+        buckets = cls([col for col in df.columns if col != 'date'], freq)
+        buckets.update(df)
+        return buckets
+
+    def reset(self):
+        width = len(self.metrics)
+        self.rows = 0
+        self.periods = np.empty(0, dtype=np.int64)
+        self.count = np.zeros((0, width), dtype=np.int64)
+        self.sum = np.zeros((0, width))
+        self.min = np.full((0, width), np.inf)
+        self.max = np.full((0, width), -np.inf)
+
+    def _add_periods(self, codes):
+        periods = np.union1d(self.periods, codes)
+        if len(periods) == len(self.periods):
+            return
+        # Старые строки агрегатов переезжают на свои места в новом порядке
+        rows = np.searchsorted(periods, self.periods)
+        for name, fill in (('count', 0), ('sum', 0.0), ('min', np.inf), ('max', -np.inf)):
+            old = getattr(self, name)
+            grown = np.full((len(periods), old.shape[1]), fill, dtype=old.dtype)
+            grown[rows] = old
+            setattr(self, name, grown)
+        self.periods = periods
+
+    def can_update(self, df):
+        return all(col in self._positions for col in df.columns if col != 'date')
+
+    def update(self, df):
+        """Учесть новые строки (в любом порядке дат)"""
+        if len(df) == 0:
+            return
+        codes = period_codes(df['date'].to_numpy(dtype='datetime64[ns]'), self.freq)
+        self._add_periods(np.unique(codes))
+
+        values = df.reindex(columns=self.metrics).to_numpy(dtype=float, na_value=np.nan)
+        rows, cols = np.nonzero(~np.isnan(values))
+        cells = (np.searchsorted(self.periods, codes)[rows], cols)
+        cell_values = values[rows, cols]
+        np.add.at(self.count, cells, 1)
+        np.add.at(self.sum, cells, cell_values)
+        np.minimum.at(self.min, cells, cell_values)
+        np.maximum.at(self.max, cells, cell_values)
+        self.rows += len(df)
+
+    def summary(self, metric, start=None, end=None):
+        """Агрегаты показателя по периодам за [start, end]
+
+        Периоды, в которые попадают границы, берутся целиком; периоды без
+        значений показателя пропускаются.
+        """
+        lo, hi = 0, len(self.periods)
+        if start is not None:
+            code = period_codes([np.datetime64(pd.Timestamp(start), 'ns')], self.freq)[0]
+            lo = int(np.searchsorted(self.periods, code, side='left'))
+        if end is not None:
+            code = period_codes([np.datetime64(pd.Timestamp(end), 'ns')], self.freq)[0]
+            hi = int(np.searchsorted(self.periods, code, side='right'))
+        hi = max(lo, hi)
+
+        j = self._positions[metric]
+        count = self.count[lo:hi, j]
+        filled = count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum[lo:hi, j] / count
+        return pd.DataFrame({
+            'count': count[filled],
+            'mean': mean[filled],
+            'min': self.min[lo:hi, j][filled],
+            'max': self.max[lo:hi, j][filled],
+        }, index=pd.Index([period_label(code, self.freq) for code in self.periods[lo:hi][filled]], name='period'))
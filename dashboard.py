@@ -0,0 +1,221 @@
+# dashboard.py - Дашборд proteinuria: отрисовка, headless-рендер и кэш картинок
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+
+import numpy as np
+
+# Столбцы, от которых зависит картинка: по ним считается ключ кэша
+DASHBOARD_COLUMNS = ('UPC_ratio', 'Protein_urine', 'Creatinine_urine', 'USG', 'CaxP', 'BUN_creatinine')
+
+# Меняется при изменении оформления - старые картинки в кэше перестают совпадать
+RENDER_VERSION = 2
+
+# Больше точек на линию не рисуем: длинные ряды прореживаются LTTB
+MAX_POINTS = 500
+
+
+def lttb(x, y, threshold):
+    """Индексы точек по Largest-Triangle-Three-Buckets
+
+    Первая и последняя точки сохраняются, из каждой корзины берется точка,
+    образующая наибольший треугольник с соседями - форма ряда (пики,
+    провалы) остается, а число точек падает до threshold.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # Средняя точка следующей корзины
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        # Текущая корзина: точка с максимальной площадью треугольника
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def series(df, column, max_points=MAX_POINTS):
+    """Даты и значения для графика; длинный ряд прореживается LTTB"""
+    if max_points is None or df[column].notna().sum() <= max_points:
+        return df['date'], df[column]
+    data = df[['date', column]].dropna()
+    x = data['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    y = data[column].to_numpy(dtype=float)
+    indices = lttb(x, y, max_points)
+    return data['date'].iloc[indices], data[column].iloc[indices]
+
+
+def draw_dashboard(fig, df, max_points=MAX_POINTS):
+    """Нарисовать дашборд почечной функции (3×2) на готовой фигуре"""
+    axes = fig.subplots(3, 2)
+
+    # 1. Соотношение UPC
+    if 'UPC_ratio' in df.columns:
+        ax = axes[0, 0]
+        upc_values = df['UPC_ratio'].dropna()
+        if len(upc_values) > 0:
+            ax.plot(*series(df, 'UPC_ratio', max_points),
+                    marker='o', linewidth=3, color='red', label='UPC')
+
+            # Зоны UPC
+            ax.axhspan(0, 0.5, alpha=0.3, color='green', label='Норма (0-0.5)')
+            ax.axhspan(0.5, 1.0, alpha=0.3, color='yellow', label='Пограничная (0.5-1.0)')
+            ax.axhspan(1.0, 2.0, alpha=0.3, color='orange', label='Proteinuria (1.0-2.0)')
+            ax.axhspan(2.0, max(upc_values.max()*1.1, 3.0), alpha=0.3, color='red', label='Тяжелая (>2.0)')
+
+            ax.set_title('📊 Соотношение БЕЛОК/КРЕАТИНИН (UPC)')
+            ax.set_ylabel('UPC ratio')
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis='x', rotation=45)
+
+    # 2. Белок мочи в мг/дл
+    if 'Protein_urine' in df.columns:
+        ax = axes[0, 1]
+        protein_values = df['Protein_urine'].dropna()
+        if len(protein_values) > 0:
+            ax.plot(*series(df, 'Protein_urine', max_points),
+                    marker='D', linewidth=2, color='purple', label='Белок мочи')
+            ax.axhspan(0, 30, alpha=0.3, color='green', label='Норма (0-30 мг/дл)')
+            ax.set_title('💧 Белок в моче')
+            ax.set_ylabel('мг/дл')
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis='x', rotation=45)
+
+    # 3. Креатинин мочи в мг/дл
+    if 'Creatinine_urine' in df.columns:
+        ax = axes[1, 0]
+        creat_values = df['Creatinine_urine'].dropna()
+        if len(creat_values) > 0:
+            ax.plot(*series(df, 'Creatinine_urine', max_points),
+                    marker='^', linewidth=2, color='green', label='Креатинин мочи')
+            ax.axhspan(50, 250, alpha=0.3, color='green', label='Норма (50-250 мг/дл)')
+            ax.set_title('💧 Креатинин мочи')
+            ax.set_ylabel('мг/дл')
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis='x', rotation=45)
+
+    # 4. Удельный вес мочи
+    if 'USG' in df.columns:
+        ax = axes[1, 1]
+        ax.plot(*series(df, 'USG', max_points),
+                marker='v', linewidth=2, color='brown', label='Удельный вес')
+        ax.axhspan(1.015, 1.045, alpha=0.3, color='green', label='Норма (1.015-1.045)')
+        ax.set_title('💧 Удельный вес мочи (USG)')
+        ax.set_ylabel('USG')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+        ax.tick_params(axis='x', rotation=45)
+
+    # 5-6. Расчетные показатели
+    derived_panels = (
+        ('CaxP', axes[2, 0], '🧮 Произведение Ca×P', 'ммоль²/л²', 'teal'),
+        ('BUN_creatinine', axes[2, 1], '🧮 Мочевина/креатинин', 'соотношение', 'navy'),
+    )
+    for column, ax, title, ylabel, color in derived_panels:
+        if column in df.columns and df[column].notna().any():
+            ax.plot(*series(df, column, max_points), marker='s', linewidth=2, color=color, label=title[2:])
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis='x', rotation=45)
+
+    fig.suptitle('🐕 МОНИТОРИНГ ПОЧЕЧНОЙ ФУНКЦИИ', fontsize=16)
+    fig.tight_layout()
+
+
+def dashboard_key(df, fmt, max_points=MAX_POINTS):
+    """Хэш дат и отображаемых столбцов: одинаковые данные - одна картинка"""
+    digest = hashlib.sha256(f'v{RENDER_VERSION}|{fmt}|{max_points}'.encode())
+    digest.update(df['date'].to_numpy(dtype='datetime64[ns]').tobytes())
+    for column in DASHBOARD_COLUMNS:
+        digest.update(column.encode())
+        if column in df.columns:
+            digest.update(df[column].to_numpy(dtype=float, na_value=np.nan).tobytes())
+    return digest.hexdigest()
+
+
+# Записи кэша старого формата (<sha256>.<формат>) - удаляются при записи
+_LEGACY_ENTRY = re.compile(r'^[0-9a-f]{64}\.\w+$')
+
+
+def _read_key(path):
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _store_cached(cache_dir, cached_path, key_path, output_path, key):
+    """Заменить запись кэша пациента новой картинкой"""
+    os.makedirs(cache_dir, exist_ok=True)
+    # Сначала убираем ключ: после сбоя посередине запись просто не совпадет
+    if os.path.exists(key_path):
+        os.remove(key_path)
+    tmp_path = f'{cached_path}.{os.getpid()}.tmp'
+    shutil.copyfile(output_path, tmp_path)
+    os.replace(tmp_path, cached_path)
+    with open(f'{key_path}.{os.getpid()}.tmp', 'w', encoding='ascii') as f:
+        f.write(key)
+    os.replace(f'{key_path}.{os.getpid()}.tmp', key_path)
+    for name in os.listdir(cache_dir):
+        if _LEGACY_ENTRY.match(name):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(cache_dir, name))
+
+
+def render_dashboard(df, output_path, fmt=None, cache_dir=None, max_points=MAX_POINTS, cache_name='dashboard'):
+    """Отрисовать дашборд в файл без дисплея (Agg); True - картинка перерисована
+
+    В cache_dir у каждого пациента (cache_name) одна картинка на формат и
+    рядом ее ключ: новая картинка заменяет старую, кэш не растет. При
+    совпадении ключа картинка копируется из кэша, matplotlib даже не
+    импортируется.
+    """
+    fmt = fmt or os.path.splitext(output_path)[1].lstrip('.').lower() or 'png'
+    cached_path = key_path = key = None
+    if cache_dir is not None:
+        key = dashboard_key(df, fmt, max_points)
+        cached_path = os.path.join(cache_dir, f'{cache_name}.{fmt}')
+        key_path = cached_path + '.key'
+        if _read_key(key_path) == key and os.path.exists(cached_path):
+            if os.path.abspath(cached_path) != os.path.abspath(output_path):
+                shutil.copyfile(cached_path, output_path)
+            return False
+
+    # Фигура без pyplot: не нужен дисплей и не трогается глобальное состояние
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(15, 14))
+    FigureCanvasAgg(fig)
+    with matplotlib.rc_context({'font.family': 'DejaVu Sans'}):
+        draw_dashboard(fig, df, max_points)
+        fig.savefig(output_path, format=fmt)
+
+    if cached_path is not None:
+        _store_cached(cache_dir, cached_path, key_path, output_path, key)
+    return True
+
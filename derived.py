@@ -0,0 +1,115 @@
+# derived.py - Расчетные показатели: объявленные входы, векторный расчет, пересчет по зависимостям
+from graphlib import TopologicalSorter
+
+import numpy as np
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    """numerator * scale / denominator; NaN при нуле или пропуске"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator * scale / denominator, np.nan)
+
+
+class DerivedMetric:
+    """Расчетный столбец: имя, входные столбцы и векторная функция от них"""
+
+    def __init__(self, name, inputs, func, title, units=''):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.func = func
+        self.title = title
+        self.units = units
+
+    def compute(self, *columns):
+        return np.asarray(self.func(*columns), dtype=float)
+
+
+DERIVED_METRICS = (
+    # Белок/креатинин мочи (оба в мг/дл)
+    DerivedMetric('UPC_ratio', ('Protein_urine', 'Creatinine_urine'),
+                  _ratio, 'Соотн. Б/К (UPC)', 'UPC'),
+    # Мочевина (ммоль/л) / креатинин (мкмоль/л → ммоль/л)
+    DerivedMetric('BUN_creatinine', ('Urea', 'Creatinine_blood'),
+                  lambda urea, creatinine: _ratio(urea, creatinine, 1000.0),
+                  'Мочевина/креатинин'),
+    DerivedMetric('CaxP', ('iCalcium', 'Phosphorus'),
+                  lambda calcium, phosphorus: calcium * phosphorus,
+                  'Ca×P', 'ммоль²/л²'),
+    # Альбумин / глобулины (общий белок - альбумин)
+    DerivedMetric('AG_ratio', ('Albumin', 'Total_protein'),
+                  lambda albumin, total: _ratio(albumin, np.where(total > albumin, total - albumin, np.nan)),
+                  'Альбумин/глобулины'),
+)
+
+
+class DerivedEngine:
+    """Граф расчетных показателей
+
+    Значения хранятся в столбцах таблицы и пересчитываются только там, где
+    поменялись входы: для новых строк и для исправленных строк - вместе со
+    всеми расчетными показателями, зависящими от измененных столбцов
+    (порядок - топологический, расчетный показатель может быть входом другого).
+    """
+
+    def __init__(self, metrics=DERIVED_METRICS):
+        self.metrics = {metric.name: metric for metric in metrics}
+        graph = {metric.name: [i for i in metric.inputs if i in self.metrics] for metric in metrics}
+        self.order = list(TopologicalSorter(graph).static_order())
+
+    @property
+    def names(self):
+        return list(self.order)
+
+    def dependents(self, columns):
+        """Расчетные показатели, которые нужно пересчитать при изменении columns"""
+        changed = set(columns)
+        result = []
+        for name in self.order:
+            if changed & set(self.metrics[name].inputs):
+                result.append(name)
+                changed.add(name)
+        return result
+
+    def apply_frame(self, df):
+        """Посчитать расчетные столбцы для порции строк (DataFrame меняется на месте)
+
+        Где входы неполные, остается значение из порции (например, UPC из
+        выгрузки лаборатории).
+        """
+        for name in self.dependents(df.columns):
+            metric = self.metrics[name]
+            if not all(column in df.columns for column in metric.inputs):
+                continue
+            inputs = [df[column].to_numpy(dtype=float, na_value=np.nan) for column in metric.inputs]
+            values = metric.compute(*inputs)
+            if name in df.columns:
+                given = df[name].to_numpy(dtype=float, na_value=np.nan)
+                values = np.where(np.isnan(values), given, values)
+            df[name] = values
+        return df
+
+    def apply_store(self, store, rows, changed):
+        """Пересчитать в хранилище строки rows для показателей, зависящих от changed"""
+        names = self.dependents(changed)
+        for name in names:
+            metric = self.metrics[name]
+            store.add_column(name)
+            inputs = [store.column(column)[rows] if column in store.metrics
+                      else np.full(len(rows), np.nan) for column in metric.inputs]
+            store.set_values(rows, name, metric.compute(*inputs))
+        return names
+
+    def fill_missing(self, store):
+        """Досчитать пропущенные расчетные значения (история до появления показателя)"""
+        for name in self.order:
+            metric = self.metrics[name]
+            store.add_column(name)
+            if not all(column in store.metrics for column in metric.inputs):
+                continue
+            rows = np.flatnonzero(~store.valid(name))
+            if len(rows) == 0:
+                continue
+            values = metric.compute(*[store.column(column)[rows] for column in metric.inputs])
+            filled = ~np.isnan(values)
+            if filled.any():
+                store.set_values(rows[filled], name, values[filled])
@@ -0,0 +1,191 @@
+# instrumentation.py - Замеры времени операций трекера, профиль сессии и счетчики
+#
+# Переменные окружения:
+#   DOG_TRACKER_PROFILE=1        - в конце сессии вывести профиль в stderr
+#   DOG_TRACKER_PROFILE=<файл>   - ... или записать его в файл
+#   DOG_TRACKER_CPROFILE=<оп>    - снять cProfile первого вызова операции в <оп>.prof
+#   DOG_TRACKER_METRICS=<файл>   - после каждой операции обновлять счетчики
+#                                  (.json - JSON, иначе текстовый формат Prometheus)
+import atexit
+import collections
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+ENV_PROFILE = 'DOG_TRACKER_PROFILE'
+ENV_CPROFILE = 'DOG_TRACKER_CPROFILE'
+ENV_METRICS = 'DOG_TRACKER_METRICS'
+
+
+class Profiler:
+    """Спаны операций и накопительные счетчики по имени операции"""
+
+    def __init__(self):
+        # Журнал последних спанов, счетчики - за всю сессию
+        self.spans = collections.deque(maxlen=1000)
+        self.counters = {}
+        self.metrics_path = os.environ.get(ENV_METRICS) or None
+        self.cprofile_target = os.environ.get(ENV_CPROFILE) or None
+        self._depth = 0
+        self._session_report = None
+
+        profile = os.environ.get(ENV_PROFILE)
+        if profile:
+            self.enable_session_report(None if profile == '1' else profile)
+
+    def enable_session_report(self, path=None):
+        """Вывести профиль сессии при выходе (в stderr или в файл)"""
+        if self._session_report is None:
+            atexit.register(self._dump_session_report)
+        self._session_report = path or '-'
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Замер одной операции; attrs (rows, bytes_read, bytes_written) можно дополнить внутри"""
+        record = {'name': name, 'depth': self._depth, 'rows': 0, 'bytes_read': 0, 'bytes_written': 0}
+        record.update(attrs)
+
+        profile = None
+        if self.cprofile_target == name:
+            # Профилируем только первый вызов операции
+            self.cprofile_target = None
+            profile = cProfile.Profile()
+            profile.enable()
+
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._depth -= 1
+            if profile is not None:
+                profile.disable()
+                self._dump_cprofile(name, profile)
+            self._record(record)
+
+    def _record(self, record):
+        self.spans.append(record)
+        counter = self.counters.setdefault(record['name'], {
+            'calls': 0, 'seconds_total': 0.0, 'seconds_max': 0.0,
+            'rows': 0, 'bytes_read': 0, 'bytes_written': 0,
+        })
+        counter['calls'] += 1
+        counter['seconds_total'] += record['seconds']
+        counter['seconds_max'] = max(counter['seconds_max'], record['seconds'])
+        for key in ('rows', 'bytes_read', 'bytes_written'):
+            counter[key] += record[key]
+        if self.metrics_path and record['depth'] == 0:
+            self.export(self.metrics_path)
+
+    def _dump_cprofile(self, name, profile):
+        path = f'{name}.prof'
+        profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(15)
+        print(f"🔬 cProfile операции {name} сохранен в {path}", file=sys.stderr)
+        print(out.getvalue(), file=sys.stderr)
+
+    def report(self):
+        """Текстовый профиль: суммарно по операциям + журнал спанов"""
+        lines = ["⏱️  ПРОФИЛЬ СЕССИИ", "=" * 86,
+                 f"{'Операция':<30}{'Вызовов':>8}{'Всего, мс':>12}{'Макс, мс':>11}"
+                 f"{'Строк':>9}{'Прочит., Б':>12}{'Запис., Б':>12}"]
+        for name, c in sorted(self.counters.items(), key=lambda item: -item[1]['seconds_total']):
+            lines.append(
+                f"{name:<30}{c['calls']:>8}{c['seconds_total'] * 1000:>12.1f}"
+                f"{c['seconds_max'] * 1000:>11.1f}{c['rows']:>9}{c['bytes_read']:>12}{c['bytes_written']:>12}"
+            )
+        lines += ["", "Журнал операций:"]
+        for span in self.spans:
+            indent = '  ' * span['depth']
+            lines.append(f"{indent}{span['name']}: {span['seconds'] * 1000:.1f} мс, строк {span['rows']}")
+        return '\n'.join(lines)
+
+    def _dump_session_report(self):
+        if not self.counters:
+            return
+        if self._session_report == '-':
+            print(self.report(), file=sys.stderr)
+        else:
+            with open(self._session_report, 'w', encoding='utf-8') as f:
+                f.write(self.report() + '\n')
+
+    def export(self, path):
+        """Счетчики в файл для мониторинга (атомарная замена файла)"""
+        if path.endswith('.json'):
+            text = json.dumps({'operations': self.counters}, ensure_ascii=False, indent=2)
+        else:
+            text = self.prometheus_text()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def prometheus_text(self):
+        metrics = (
+            ('calls', 'counter', 'Число вызовов операции'),
+            ('seconds_total', 'counter', 'Суммарное время операции, с'),
+            ('seconds_max', 'gauge', 'Максимальное время одного вызова, с'),
+            ('rows', 'counter', 'Обработано строк'),
+            ('bytes_read', 'counter', 'Прочитано байт'),
+            ('bytes_written', 'counter', 'Записано байт'),
+        )
+        lines = []
+        for key, kind, help_text in metrics:
+            metric = f'dog_tracker_operation_{key}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, counter in sorted(self.counters.items()):
+                lines.append(f'{metric}{{operation="{name}"}} {counter[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Профилировщик сессии - один на процесс
+profiler = Profiler()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def instrumented(name, io_kind=None):
+    """Декоратор метода трекера: спан с числом строк и байтами файла данных
+
+    io_kind='read'   - файл данных прочитан целиком (строк - вся история);
+    io_kind='write'  - файл перезаписан целиком (байт - новый размер);
+    io_kind='append' - дописаны строки (строк - прирост; байт - запись в журнал
+                       плюс прирост файла данных).
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            path = getattr(getattr(self, 'storage', None), 'path', None)
+            store = getattr(self, 'store', None)
+            rows_before = len(store) if store is not None else 0
+            size_before = _file_size(path) if io_kind == 'append' else 0
+            journal = getattr(self, 'journal', None)
+            journal_before = journal.bytes_written if journal is not None else 0
+            with profiler.span(name) as span:
+                result = method(self, *args, **kwargs)
+                rows_after = len(self.store) if getattr(self, 'store', None) is not None else 0
+                span['rows'] = rows_after - rows_before if io_kind == 'append' else rows_after
+                if io_kind == 'read':
+                    span['bytes_read'] = _file_size(path)
+                elif io_kind == 'write':
+                    span['bytes_written'] = _file_size(path)
+                elif io_kind == 'append':
+                    journal_bytes = journal.bytes_written - journal_before if journal is not None else 0
+                    span['bytes_written'] = journal_bytes + max(_file_size(path) - size_before, 0)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,241 @@
+# journal.py - Журнал упреждающей записи измерений и блокировка файла данных
+import contextlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка первого байта lock-файла
+    fcntl = None
+    import msvcrt
+
+# Номер последней записи журнала, перенесенной в хранилище (служебные данные)
+META_KEY = 'journal_applied'
+# Имя показателя становится столбцом хранилища
+METRIC_NAME = re.compile(r'^\w+$')
+
+
+class Journal:
+    """Журнал новых измерений рядом с файлом данных: <данные>.journal
+
+    - новое измерение - одна строка JSON в конце журнала + fsync;
+    - в основное хранилище записи переносятся пакетами (checkpoint),
+      номер последней перенесенной записи хранится в служебных данных
+      хранилища, после чего журнал очищается;
+    - при загрузке неперенесенные записи дочитываются из журнала.
+
+    Чтение, запись и перенос идут под рекомендательной блокировкой
+    <данные>.journal.lock, поэтому несколько процессов трекера не теряют
+    визиты друг друга. Недописанная строка после сбоя отбрасывается, запись,
+    которую нельзя разобрать, при переносе уходит в <данные>.journal.bad.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.bad_path = path + '.bad'
+        # Байт, дописанных в журнал этим процессом (для профилировщика)
+        self.bytes_written = 0
+        self._lock_file = None
+        self._lock_depth = 0
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Эксклюзивная блокировка между процессами (повторный вход разрешен)"""
+        if self._lock_depth == 0:
+            f = open(self.lock_path, 'a+b')
+            try:
+                _lock(f)
+            except BaseException:
+                f.close()
+                raise
+            self._lock_file = f
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                f, self._lock_file = self._lock_file, None
+                _unlock(f)
+                f.close()
+
+    def _scan(self):
+        """Целые записи журнала и длина их корректной части в байтах"""
+        entries, valid = [], 0
+        if not os.path.exists(self.path):
+            return entries, valid
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                valid += len(line)
+        return entries, valid
+
+    def _unapplied(self, storage):
+        """Неперенесенные записи: (номер последней, [DataFrame], [испорченные записи])"""
+        applied = storage.load_meta(META_KEY) or 0
+        entries, _ = self._scan()
+        last_id, frames, bad = applied, [], []
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('id'), int):
+                bad.append(entry)
+                continue
+            if entry['id'] <= applied:
+                continue
+            last_id = max(last_id, entry['id'])
+            try:
+                frames.append(_frame(entry['rows']))
+            except (ValueError, TypeError, KeyError):
+                bad.append(entry)
+        return last_id, frames, bad
+
+    def pending(self, storage):
+        """Записи, еще не перенесенные в хранилище: DataFrame (или None)"""
+        with self.lock():
+            _, frames, bad = self._unapplied(storage)
+        if bad:
+            print(f"⚠️  Журнал: пропущено испорченных записей: {len(bad)}")
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def append(self, df, storage):
+        """Дописать строки одной записью журнала; возвращает число неперенесенных записей"""
+        with self.lock():
+            applied = storage.load_meta(META_KEY) or 0
+            entries, valid = self._scan()
+            ids = [entry['id'] for entry in entries
+                   if isinstance(entry, dict) and isinstance(entry.get('id'), int)]
+            entry_id = max([applied] + ids) + 1
+            rows = json.dumps(_records(df), ensure_ascii=False)
+            with open(self.path, 'ab') as f:
+                if f.tell() > valid:
+                    # Хвост, оборванный сбоем, - отрезаем перед записью
+                    f.truncate(valid)
+                    f.seek(valid)
+                line = f'{{"id": {entry_id}, "rows": {rows}}}\n'.encode('utf-8')
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.bytes_written += len(line)
+            return sum(1 for i in ids if i > applied) + 1
+
+    def checkpoint(self, storage, df=None, derived=()):
+        """Перенести записи журнала в хранилище и очистить журнал
+
+        df - вся таблица для полной перезаписи хранилища (к ней добавляются
+        строки хранилища и журнала, которых в ней нет); без нее строки журнала
+        дописываются к тому, что сейчас лежит в хранилище (его могли дополнить
+        другие процессы). derived - расчетные столбцы: в df они могут быть
+        досчитаны, поэтому строки сравниваются без них. Возвращает число
+        перенесенных строк.
+        """
+        with self.lock():
+            last_id, frames, bad = self._unapplied(storage)
+            meta = {META_KEY: last_id}
+            moved = 0
+            if bad:
+                # Испорченные записи не блокируют перенос остальных - откладываем в сторону
+                with open(self.bad_path, 'a', encoding='utf-8') as f:
+                    for entry in bad:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                print(f"⚠️  Журнал: испорченные записи перенесены в {self.bad_path}: {len(bad)}")
+
+            if df is not None:
+                # Строки других процессов (уже в хранилище или еще в журнале),
+                # которых нет в df, не теряются при полной перезаписи
+                others = ([storage.load()] if storage.exists() else []) + frames
+                if others:
+                    rows = new_rows(df, pd.concat(others, ignore_index=True), ignore=derived)
+                    moved = len(rows)
+                    if moved:
+                        df = pd.concat([df, rows], ignore_index=True).sort_values(
+                            'date', kind='stable', ignore_index=True)
+                storage.save(df, meta=meta)
+            elif frames:
+                rows = pd.concat(frames, ignore_index=True)
+                if storage.append_only:
+                    storage.append(rows, meta=meta)
+                else:
+                    history = storage.load() if storage.exists() else pd.DataFrame({'date': []})
+                    rows = new_rows(history, rows)
+                    merged = pd.concat([history, rows], ignore_index=True)
+                    storage.save(merged.sort_values('date', kind='stable', ignore_index=True), meta=meta)
+                moved = len(rows)
+
+            if os.path.exists(self.path):
+                with open(self.path, 'wb') as f:
+                    os.fsync(f.fileno())
+            return moved
+
+
+def new_rows(history, rows, ignore=()):
+    """Строки журнала, которых еще нет в истории
+
+    Книга Excel и номер перенесенной записи пишутся в разные файлы: если сбой
+    пришелся между ними, уже перенесенные строки не дублируются. Столбцы
+    ignore (расчетные) в сравнении не участвуют.
+    """
+    if len(history) == 0 or len(rows) == 0:
+        return rows
+    columns = ['date'] + sorted((set(history.columns) | set(rows.columns)) - {'date'} - set(ignore))
+    combined = pd.concat([history, rows], ignore_index=True).reindex(columns=columns)
+    keys = pd.util.hash_pandas_object(combined, index=False).to_numpy()
+    seen = np.isin(keys[len(history):], keys[:len(history)])
+    return rows[~seen].reset_index(drop=True)
+
+
+def _records(df):
+    """Строки для журнала: repr float восстанавливается точно (to_json округляет)"""
+    metrics = [col for col in df.columns if col != 'date']
+    dates = pd.to_datetime(df['date']).map(pd.Timestamp.isoformat)
+    values = df[metrics].to_numpy(dtype=float, na_value=np.nan)
+    return [
+        {'date': date, **{metric: (None if np.isnan(value) else float(value))
+                          for metric, value in zip(metrics, row)}}
+        for date, row in zip(dates, values)
+    ]
+
+
+def _frame(rows):
+    """Строки записи журнала → DataFrame; ValueError, если запись испорчена"""
+    df = pd.DataFrame(rows)
+    metrics = [col for col in df.columns if col != 'date']
+    if 'date' not in df.columns or not all(isinstance(col, str) and METRIC_NAME.match(col) for col in metrics):
+        raise ValueError("Неверные столбцы записи журнала")
+    df['date'] = pd.to_datetime(df['date'])
+    if df['date'].isna().any():
+        raise ValueError("Запись журнала без даты")
+    for metric in metrics:
+        df[metric] = pd.to_numeric(df[metric]).astype(float)
+    return df
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK сдается примерно через 10 секунд - ждем дальше
+            continue
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
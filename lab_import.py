@@ -0,0 +1,165 @@
+# lab_import.py - Потоковый импорт выгрузок лаборатории (CSV/XLSX)
+import argparse
+import os
+import re
+
+import pandas as pd
+
+# Названия столбцов в выгрузках лабораторий → ключи трекера.
+# Ключи сравниваются после normalize_header(); сами ключи трекера
+# и их русские названия добавляются автоматически (см. build_aliases).
+COLUMN_ALIASES = {
+    'date': 'date', 'дата': 'date', 'датаанализа': 'date', 'sampledate': 'date',
+    'collectiondate': 'date', 'датаизмерения': 'date',
+    'hgb': 'Hb', 'гематокритhct': 'HCT',
+    'creatinine': 'Creatinine_blood', 'crea': 'Creatinine_blood', 'креатинин': 'Creatinine_blood',
+    'phos': 'Phosphorus', 'p': 'Phosphorus',
+    'k': 'Potassium', 'na': 'Sodium', 'cl': 'Chloride',
+    'ica': 'iCalcium', 'ионизированныйкальций': 'iCalcium',
+    'lipa': 'Lipase', 'cpl': 'Lipase', 'липаза': 'Lipase', 'amyl': 'Amylase',
+    'alb': 'Albumin', 'tp': 'Total_protein', 'totalprotein': 'Total_protein',
+    'ctni': 'Troponin', 'удельныйвесмочи': 'USG', 'sg': 'USG',
+    'upro': 'Protein_urine', 'urineprotein': 'Protein_urine', 'белоквмоче': 'Protein_urine',
+    'ucrea': 'Creatinine_urine', 'urinecreatinine': 'Creatinine_urine',
+    'upc': 'UPC_ratio', 'upcr': 'UPC_ratio',
+    'лейкоцитывмоче': 'Leukocytes_urine', 'глюкозавмоче': 'Glucose_urine',
+}
+
+
+def normalize_header(name):
+    """Название столбца без регистра, пробелов, скобок и знаков"""
+    return re.sub(r'[\W_]+', '', str(name).lower())
+
+
+def build_aliases(tracker):
+    """Словарь псевдонимов с учетом показателей конкретного трекера"""
+    aliases = dict(COLUMN_ALIASES)
+    for metric in tracker.reference_ranges:
+        aliases[normalize_header(metric)] = metric
+        aliases[normalize_header(tracker.get_metric_name(metric))] = metric
+    return aliases
+
+
+def iter_lab_chunks(path, chunksize=1000, **read_options):
+    """Читать выгрузку порциями по chunksize строк, не загружая файл целиком"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    yield pd.DataFrame(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            workbook.close()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, **read_options)
+
+
+def new_report():
+    """Что при импорте пропущено или не распознано (для итоговой сводки)"""
+    return {'dropped_rows': 0, 'coerced': {}, 'examples': {}, 'ignored_columns': []}
+
+
+def map_columns(chunk, aliases, report=None):
+    """Переименовать столбцы лаборатории в ключи трекера, лишние отбросить"""
+    mapping = {}
+    for column in chunk.columns:
+        key = aliases.get(normalize_header(column))
+        if key is not None and key not in mapping.values():
+            mapping[column] = key
+        elif report is not None and str(column) not in report['ignored_columns']:
+            report['ignored_columns'].append(str(column))
+    return chunk[list(mapping)].rename(columns=mapping)
+
+
+def prepare_chunk(tracker, chunk, aliases, dayfirst=False, report=None):
+    """Порция выгрузки → таблица трекера: типы и даты (UPC и др. считает трекер)
+
+    report (new_report()) накапливает строки без даты, значения, которые не
+    удалось прочитать как число (остаются пустыми), и нераспознанные столбцы.
+    """
+    report = report if report is not None else new_report()
+    chunk = map_columns(chunk, aliases, report)
+    if 'date' not in chunk.columns:
+        raise ValueError("В выгрузке нет столбца с датой анализа")
+
+    chunk = chunk.copy()
+    chunk['date'] = pd.to_datetime(chunk['date'], dayfirst=dayfirst, errors='coerce')
+    dated = chunk['date'].notna()
+    report['dropped_rows'] += int((~dated).sum())
+    chunk = chunk[dated]
+
+    for metric in chunk.columns.drop('date'):
+        column = chunk[metric]
+        if not pd.api.types.is_numeric_dtype(column):
+            # Десятичная запятая и текстовые пометки лаборатории
+            column = column.astype(str).str.strip().str.replace(',', '.', regex=False)
+        values = pd.to_numeric(column, errors='coerce')
+        # Непустая ячейка, ставшая NaN, - значение вроде ">300" или "н/о"
+        lost = values.isna() & chunk[metric].notna() & ~column.isin(['', 'nan', 'None'])
+        if lost.any():
+            report['coerced'][metric] = report['coerced'].get(metric, 0) + int(lost.sum())
+            report['examples'].setdefault(metric, str(chunk[metric][lost].iloc[0]))
+        chunk[metric] = values
+
+    return chunk.sort_values('date', kind='stable')
+
+
+def show_report(report):
+    """Вывести, что при импорте было пропущено"""
+    if report['dropped_rows']:
+        print(f"⚠️  Пропущено строк без даты (или с нечитаемой датой): {report['dropped_rows']}")
+    for metric, count in report['coerced'].items():
+        print(f"⚠️  {metric}: нечисловых значений {count} (например '{report['examples'][metric]}') - оставлены пустыми")
+    if report['ignored_columns']:
+        print(f"ℹ️  Нераспознанные столбцы (не импортированы): {', '.join(report['ignored_columns'])}")
+
+
+def import_lab_file(tracker, path, chunksize=1000, dayfirst=False, **read_options):
+    """Импорт выгрузки в трекер: каждая порция сохраняется одним пакетом"""
+    aliases = build_aliases(tracker)
+    report = new_report()
+    total = 0
+    alerts = []
+    for chunk in iter_lab_chunks(path, chunksize=chunksize, **read_options):
+        rows = prepare_chunk(tracker, chunk, aliases, dayfirst=dayfirst, report=report)
+        if len(rows) == 0:
+            continue
+        chunk_alerts = tracker.append_measurements(rows, verbose=False)
+        if len(chunk_alerts):
+            alerts.append(chunk_alerts)
+        total += len(rows)
+        print(f"📥 Импортировано строк: {total}")
+    print(f"✅ Импорт завершен: {total} строк из {os.path.basename(path)}")
+    show_report(report)
+    if alerts:
+        alerts = pd.concat(alerts, ignore_index=True)
+        print(f"🚨 Переходов в тревожные классы: {len(alerts)} (последние {min(len(alerts), 10)}):")
+        tracker.show_alerts(alerts.tail(10))
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт выгрузки лаборатории в трекер")
+    parser.add_argument('lab_file', help='CSV или XLSX выгрузка лаборатории')
+    parser.add_argument('--data', default='dog_medical_data.db', help='файл данных трекера')
+    parser.add_argument('--chunksize', type=int, default=1000)
+    parser.add_argument('--sep', default=',', help='разделитель CSV')
+    parser.add_argument('--dayfirst', action='store_true', help='даты в формате ДД.ММ.ГГГГ')
+    args = parser.parse_args()
+
+    from medical_tracker import DogMedicalTracker
+    tracker = DogMedicalTracker(args.data)
+    options = {} if args.lab_file.lower().endswith(('.xlsx', '.xlsm')) else {'sep': args.sep}
+    import_lab_file(tracker, args.lab_file, chunksize=args.chunksize,
+                    dayfirst=args.dayfirst, **options)
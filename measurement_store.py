@@ -0,0 +1,183 @@
+# measurement_store.py - Компактное типизированное хранилище измерений в памяти
+import numpy as np
+import pandas as pd
+
+
+def _set_bits(bits, start, mask):
+    """Записать булеву маску в упакованный битовый массив начиная с бита start"""
+    if len(mask) == 0:
+        return
+    first_byte = start // 8
+    last_byte = (start + len(mask) + 7) // 8
+    segment = np.unpackbits(bits[first_byte:last_byte])
+    offset = start - first_byte * 8
+    segment[offset:offset + len(mask)] = mask
+    bits[first_byte:last_byte] = np.packbits(segment)
+
+
+class MeasurementStore:
+    """Столбцы показателей - отдельные массивы NumPy фиксированного типа
+
+    - date: datetime64[ns], значения: float64 (float32 искажал бы точные
+      границы диапазонов вроде USG 1.015);
+    - добавление в буферы с запасом (рост вдвое) - амортизированно O(новых строк);
+    - для каждого показателя битовая карта заполненных значений (1 бит на строку);
+    - frame() отдает pandas-представление без копирования (только чтение).
+
+    Строки всегда упорядочены по дате; при вставке "в прошлое" буферы
+    переупорядочиваются целиком - в новые массивы. Уже записанные значения
+    на месте не меняются: выданные раньше frame() и срезы остаются прежними.
+    """
+
+    def __init__(self, metrics=(), capacity=16):
+        self.size = 0
+        self.capacity = capacity
+        self._dates = np.empty(capacity, dtype='datetime64[ns]')
+        self._columns = {}
+        self._valid = {}
+        self._frame = None
+        for metric in metrics:
+            self.add_column(metric)
+
+    @classmethod
+    def from_frame(cls, df):
+        metrics = [col for col in df.columns if col != 'date']
+        store = cls(metrics, capacity=max(16, len(df)))
+        store.append(df)
+        return store
+
+    @property
+    def metrics(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return self.size
+
+    def add_column(self, metric):
+        """Новый показатель: пустой столбец (NaN) той же длины"""
+        if metric in self._columns:
+            return
+        self._columns[metric] = np.full(self.capacity, np.nan)
+        self._valid[metric] = np.zeros((self.capacity + 7) // 8, dtype=np.uint8)
+        self._frame = None
+
+    def _reserve(self, extra):
+        if self.size + extra <= self.capacity:
+            return
+        capacity = max(self.capacity * 2, self.size + extra)
+        dates = np.empty(capacity, dtype='datetime64[ns]')
+        dates[:self.size] = self._dates[:self.size]
+        self._dates = dates
+        for metric, column in self._columns.items():
+            grown = np.full(capacity, np.nan, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[metric] = grown
+            bits = np.zeros((capacity + 7) // 8, dtype=np.uint8)
+            bits[:len(self._valid[metric])] = self._valid[metric]
+            self._valid[metric] = bits
+        self.capacity = capacity
+
+    def append(self, df):
+        """Дописать строки DataFrame (date + показатели); True - порядок сохранен"""
+        count = len(df)
+        if count == 0:
+            return True
+        for col in df.columns:
+            if col != 'date':
+                self.add_column(col)
+
+        dates = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]')
+        in_order = bool(np.all(dates[1:] >= dates[:-1]))
+        if in_order and self.size > 0:
+            in_order = dates[0] >= self._dates[self.size - 1]
+
+        self._reserve(count)
+        start, end = self.size, self.size + count
+        self._dates[start:end] = dates
+        for metric, column in self._columns.items():
+            if metric in df.columns:
+                values = df[metric].to_numpy(dtype=float, na_value=np.nan)
+                column[start:end] = values
+                _set_bits(self._valid[metric], start, ~np.isnan(values))
+            else:
+                column[start:end] = np.nan
+                _set_bits(self._valid[metric], start, np.zeros(count, dtype=bool))
+        self.size = end
+
+        if not in_order:
+            self._sort()
+        self._frame = None
+        return in_order
+
+    def set_values(self, rows, metric, values):
+        """Исправить значения показателя в строках rows (даты не меняются)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        # Копия столбца - старые представления (frame()) не меняются под вызывающим
+        column = self._columns[metric].copy()
+        column[rows] = values
+        self._columns[metric] = column
+        mask = np.unpackbits(self._valid[metric], count=self.size).astype(bool)
+        mask[rows] = ~np.isnan(column[rows])
+        bits = np.zeros_like(self._valid[metric])
+        bits[:(self.size + 7) // 8] = np.packbits(mask)
+        self._valid[metric] = bits
+        self._frame = None
+
+    def _sort(self):
+        order = np.argsort(self._dates[:self.size], kind='stable')
+        dates = np.empty(self.capacity, dtype='datetime64[ns]')
+        dates[:self.size] = self._dates[:self.size][order]
+        self._dates = dates
+        for metric, column in self._columns.items():
+            sorted_column = np.full(self.capacity, np.nan, dtype=column.dtype)
+            sorted_column[:self.size] = column[:self.size][order]
+            self._columns[metric] = column = sorted_column
+            bits = np.zeros_like(self._valid[metric])
+            bits[:(self.size + 7) // 8] = np.packbits(~np.isnan(column[:self.size]))
+            self._valid[metric] = bits
+
+    @property
+    def dates(self):
+        return self._dates[:self.size]
+
+    def window(self, start=None, end=None):
+        """Границы строк [lo, hi) для дат из [start, end] - бинарным поиском"""
+        lo, hi = 0, self.size
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left'))
+        if end is not None:
+            hi = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right'))
+        return lo, max(lo, hi)
+
+    def column(self, metric):
+        """Значения показателя без копирования"""
+        return self._columns[metric][:self.size]
+
+    def valid(self, metric):
+        """Маска заполненных значений из битовой карты"""
+        return np.unpackbits(self._valid[metric], count=self.size).astype(bool)
+
+    def counts(self):
+        """Число заполненных значений по каждому показателю"""
+        return {
+            metric: int(np.unpackbits(bits, count=self.size).sum())
+            for metric, bits in self._valid.items()
+        }
+
+    def frame(self):
+        """pandas-представление без копирования (только чтение), с кэшем"""
+        if self._frame is None:
+            data = {'date': self.dates}
+            for metric in self._columns:
+                data[metric] = self.column(metric)
+            for values in data.values():
+                values.flags.writeable = False
+            self._frame = pd.DataFrame(data, copy=False)
+        return self._frame
+
+    def memory_usage(self):
+        """Байт под буферы (дата, значения, битовые карты)"""
+        total = self._dates.nbytes
+        for metric, column in self._columns.items():
+            total += column.nbytes + self._valid[metric].nbytes
+        return total
@@ -1,15 +1,37 @@
 # dog_medical_tracker.py - С транспонированной таблицей
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-from datetime import datetime
+import argparse
 import os
 
-plt.rcParams['font.family'] = 'DejaVu Sans'
+from storage import open_storage, SQLiteStorage
+from status import StatusEngine, BELOW, IN_RANGE, ABOVE, MISSING
+from rules import IntervalIndex, RuleSet
+from trends import TrendStats, TREND_METRICS
+from pivot_view import PivotView
+from measurement_store import MeasurementStore
+from buckets import TimeBuckets, FREQUENCIES
+from derived import DerivedEngine
+from anomaly import AnomalyDetector, cohort_stats
+from instrumentation import instrumented, profiler
+from journal import Journal, new_rows
 
 class DogMedicalTracker:
-    def __init__(self, data_file='dog_medical_data.xlsx'):
-        self.data_file = data_file
+    def __init__(self, data_file='dog_medical_data.xlsx', storage=None, checkpoint_every=None):
+        # Хранилище выбирается по расширению файла (.xlsx / .db)
+        self.storage = storage if storage is not None else open_storage(data_file)
+        self.data_file = self.storage.path
+        # Кэш дашбордов общий для каталога, запись в нем - по имени файла пациента
+        self.dashboard_cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(self.data_file)), 'dashboard_cache')
+        self.dashboard_cache_name = os.path.basename(self.data_file)
+        
+        # Новые измерения сначала пишутся в журнал, в хранилище - пакетами:
+        # SQLite дописывает строку дешево, книгу Excel выгодно переписывать реже
+        self.journal = Journal(self.data_file + '.journal')
+        if checkpoint_every is None:
+            checkpoint_every = 1 if self.storage.append_only else 20
+        self.checkpoint_every = checkpoint_every
         
         # Референсные значения для СОБАК с учетом ХБП 3 стадии
         self.reference_ranges = {
@@ -59,23 +81,329 @@ class DogMedicalTracker:
             'тяжелая proteinuria': (2.0, float('inf'))
         }
         
+        self.upc_recommendations = {
+            'норма': "✅ Отличный показатель!",
+            'пограничная': "⚠️ Требуется наблюдение, возможно назначение ИАПФ",
+            'proteinuria': "🚨 Рекомендованы ИАПФ, контроль каждые 2-4 недели",
+            'тяжелая proteinuria': "🚨 СРОЧНАЯ КОНСУЛЬТАЦИЯ ВЕТЕРИНАРА!",
+        }
+        
+        # Диапазоны показателей, характерные для ХБП 3 стадии
+        self.ckd_stage_ranges = {
+            'Creatinine_blood': (180, 440),
+            'Urea': (10, 25),
+            'Phosphorus': (1.6, 3.0),
+            'SDMA': (18, 35)
+        }
+        
+        # Границы собираются в массивы один раз, сетки статусов кэшируются
+        self.status_engines = {
+            'reference': StatusEngine(self.reference_ranges),
+            'ckd': StatusEngine(self.ckd_stage_ranges),
+        }
+        self._status_grids = {}
+        self._pivot = None
+        
+        # Классы UPC и стадии ХБП - таблицы интервалов; оповещения о переходах
+        # в тревожные классы (состояние - последний класс по каждому правилу)
+        self.rules = RuleSet()
+        self.rules.add('upc', 'UPC_ratio', IntervalIndex.from_classes(self.upc_classification),
+                       alert_on=('proteinuria', 'тяжелая proteinuria'))
+        for metric, (low, high) in self.ckd_stage_ranges.items():
+            index = IntervalIndex.from_range(low, high, labels=('ниже 3 стадии', '3 стадия', 'выше 3 стадии'))
+            self.rules.add(f'ckd_{metric}', metric, index, alert_on=('выше 3 стадии',))
+        self._rule_state = None
+        self._buckets = {}
+        
+        # Расчетные показатели (UPC, мочевина/креатинин, Ca×P, А/Г)
+        self.derived = DerivedEngine()
+        
+        # Аномалии относительно своей истории и когорты клиники (строится по запросу)
+        self._anomaly = None
+        self._cohort = None
+        
         self.load_data()
     
+    @property
+    def df(self):
+        """Все измерения: pandas-представление колоночного хранилища (только чтение)"""
+        return self.store.frame()
+    
+    @df.setter
+    def df(self, value):
+        self.store = MeasurementStore.from_frame(value)
+        self.derived.fill_missing(self.store)
+        self._on_data_changed()
+    
+    @instrumented('load_data', 'read')
     def load_data(self):
-        if os.path.exists(self.data_file):
-            self.df = pd.read_excel(self.data_file)
-            self.df['date'] = pd.to_datetime(self.df['date'])
+        # Хранилище и журнал читаются под одной блокировкой - согласованно
+        with self.journal.lock():
+            history = self.storage.load() if self.storage.exists() else None
+            pending = self.journal.pending(self.storage)
+        
+        if history is not None:
+            self.store = MeasurementStore.from_frame(history)
+            # В SQLite есть только столбцы, которые уже заполнялись
+            for metric in self.reference_ranges:
+                self.store.add_column(metric)
             print("✅ Данные загружены из файла")
             print(f"📊 Записей в базе: {len(self.df)}")
         else:
-            columns = ['date'] + list(self.reference_ranges.keys())
-            self.df = pd.DataFrame(columns=columns)
+            self.store = MeasurementStore(self.reference_ranges)
             print("📁 Создан новый файл для данных собаки")
+        
+        # Восстановление: записи журнала, не дошедшие до хранилища
+        if pending is not None:
+            if history is not None and not self.storage.append_only:
+                pending = new_rows(history, pending)
+            self.store.append(pending)
+            self.checkpoint()
+            print(f"🔁 Из журнала восстановлено записей: {len(pending)}")
+        
+        # Расчетные показатели для старых записей (в памяти, без перезаписи файла)
+        self.derived.fill_missing(self.store)
+        
+        # Тренды хранятся вместе с данными; если не совпали с таблицей - пересчет
+        saved_trends = self.storage.load_meta('trends')
+        self.trends = TrendStats()
+        if saved_trends and tuple(saved_trends['metrics']) == TREND_METRICS:
+            self.trends = TrendStats.from_dict(saved_trends)
+        self._on_data_changed()
+    
+    def _on_data_changed(self, appended=None):
+        """Обновить производные структуры после изменения self.df
+        
+        appended - строки, дописанные в конец таблицы (по дате)
+        """
+        self._status_grids = {}
+        if appended is None:
+            self._rule_state = None
+            self._anomaly = None
+        # Агрегаты по периодам: новые строки дописываются, иначе - пересборка по запросу
+        if appended is not None and all(b.can_update(appended) for b in self._buckets.values()):
+            for buckets in self._buckets.values():
+                buckets.update(appended)
+        else:
+            self._buckets = {}
+        if appended is not None and self._pivot is not None and self._pivot.can_append(appended):
+            self._pivot.append(appended)
+        else:
+            self._pivot = None
+        if self.trends.sync(self.df, appended) and len(self.df) > 0:
+            # Служебные данные общие с журналом - пишем под его блокировкой
+            with self.journal.lock():
+                self.storage.save_meta('trends', self.trends.to_dict())
+    
+    def status_grid(self, kind='reference'):
+        """Сетка статусов (даты × показатели) по всей истории, с кэшем"""
+        if kind not in self._status_grids:
+            with profiler.span('status_grid', rows=len(self.store)):
+                self._status_grids[kind] = self.status_engines[kind].evaluate(self.df)
+        return self._status_grids[kind]
+    
+    def query_range(self, metric, start=None, end=None):
+        """Значения показателя за даты [start, end]: O(log n + результат)"""
+        if metric not in self.store.metrics:
+            raise KeyError(f"Неизвестный показатель: {metric}")
+        lo, hi = self.store.window(start, end)
+        values = self.store.column(metric)[lo:hi]
+        filled = ~np.isnan(values)
+        dates = pd.DatetimeIndex(self.store.dates[lo:hi][filled], name='date')
+        return pd.Series(values[filled], index=dates, name=metric)
+    
+    def query_rows(self, start=None, end=None):
+        """Все измерения за даты [start, end] (срез без копирования)"""
+        lo, hi = self.store.window(start, end)
+        return self.df.iloc[lo:hi]
+    
+    def time_buckets(self, freq='M'):
+        """Агрегаты по месяцам ('M') или кварталам ('Q'), с кэшем"""
+        if freq not in self._buckets:
+            with profiler.span('buckets_build', rows=len(self.store)):
+                self._buckets[freq] = TimeBuckets.from_frame(self.df, freq)
+        return self._buckets[freq]
     
+    @instrumented('save_data', 'write')
     def save_data(self):
-        self.df.to_excel(self.data_file, index=False)
+        # Визиты, записанные другими процессами, дописываются к таблице, а не теряются
+        merged = self.journal.checkpoint(self.storage, df=self.df, derived=self.derived.names)
+        if merged:
+            self.load_data()
         print("💾 Данные сохранены")
     
+    @instrumented('export_excel')
+    def export_excel(self, path=None):
+        """Выгрузка всей истории в Excel (по умолчанию <имя>_export.xlsx)
+        
+        Файл данных и исходная книга импорта не перезаписываются.
+        """
+        if path is None:
+            path = os.path.splitext(self.data_file)[0] + '_export.xlsx'
+        if os.path.abspath(path) == os.path.abspath(self.storage.path):
+            raise ValueError("Выгрузка не может перезаписать файл данных")
+        self.df.to_excel(path, index=False)
+        print(f"📤 Данные выгружены в {path}")
+    
+    def coerce_measurements(self, records):
+        """Проверить и привести порцию измерений: даты, числа, известные показатели
+        
+        Проверка идет до записи в журнал - ошибочная порция не попадает на диск
+        и не мешает следующим записям. Ошибки - ValueError.
+        """
+        df = pd.DataFrame(records)
+        if len(df) == 0:
+            return df
+        if 'date' not in df.columns:
+            raise ValueError("Не указана дата измерения")
+        unknown = [col for col in df.columns
+                   if col != 'date' and col not in self.reference_ranges and col not in self.derived.metrics]
+        if unknown:
+            raise ValueError(f"Неизвестные показатели: {', '.join(map(str, unknown))}")
+        try:
+            df['date'] = pd.to_datetime(df['date'])
+        except (ValueError, TypeError) as error:
+            raise ValueError(f"Неверная дата: {error}") from None
+        if df['date'].isna().any():
+            raise ValueError("Не указана дата измерения")
+        for metric in df.columns.drop('date'):
+            try:
+                df[metric] = pd.to_numeric(df[metric]).astype(float)
+            except (ValueError, TypeError):
+                raise ValueError(f"{metric}: значение должно быть числом") from None
+        return df
+    
+    @instrumented('append_measurements', 'append')
+    def append_measurements(self, records, verbose=True):
+        """Добавить измерения без диалога (список словарей или DataFrame)"""
+        new_df = self.coerce_measurements(records)
+        if len(new_df) == 0:
+            return
+        self.derived.apply_frame(new_df)
+        
+        # Запись на диск - одна строка журнала; в хранилище строки переносятся
+        # пакетами поверх его текущего содержимого (его могли дополнить другие процессы)
+        with self.journal.lock():
+            if self.journal.append(new_df, self.storage) >= self.checkpoint_every:
+                self.journal.checkpoint(self.storage)
+        
+        # Строки дописываются в буферы; вся таблица переупорядочивается,
+        # только если новые даты раньше последней
+        previous = self._alert_state()
+        detector = self.anomaly_detector() if verbose else self._anomaly
+        in_order = self.store.append(new_df)
+        self._on_data_changed(appended=new_df if in_order else None)
+        
+        # Новые строки в конце - оцениваются по окнам истории, без пересчета всей таблицы
+        anomalies = None
+        if detector is not None and in_order:
+            anomalies = detector.score_appended(new_df)
+            self._anomaly = detector
+        
+        # Оповещения: новые строки продолжают состояние правил по истории
+        if in_order:
+            alerts, self._rule_state = self.rules.events(new_df, previous)
+        else:
+            alerts, self._rule_state = self.rules.events(self.df)
+            alerts = alerts[alerts['date'].isin(new_df['date'])].reset_index(drop=True)
+        if verbose:
+            print("💾 Данные сохранены")
+            self.show_alerts(alerts)
+            if anomalies is not None:
+                self.show_anomalies(anomalies)
+        return alerts
+    
+    def _alert_state(self):
+        """Последний класс по каждому правилу для всей истории (с кэшем)"""
+        if self._rule_state is None:
+            _, self._rule_state = self.rules.events(self.df)
+        return self._rule_state
+    
+    def alert_history(self):
+        """Все переходы в тревожные классы за историю (один проход)"""
+        alerts, self._rule_state = self.rules.events(self.df)
+        return alerts
+    
+    def show_alerts(self, alerts):
+        """Вывести оповещения о переходах в тревожные классы"""
+        for row in alerts.itertuples(index=False):
+            line = f"🚨 {row.date:%d.%m.%Y} {self.get_metric_name(row.metric)}: {row.value:.2f} - {row.label}"
+            if row.previous is not None:
+                line += f" (было: {row.previous})"
+            print(line)
+    
+    def anomaly_detector(self):
+        """Детектор аномалий, обученный на всей истории (с кэшем)"""
+        if self._anomaly is None:
+            self.find_anomalies()
+        return self._anomaly
+    
+    def find_anomalies(self):
+        """Аномалии за всю историю: резкие скачки, отклонения от своей медианы и от когорты"""
+        # Когорта - все пациенты хранилища клиники; читается один раз
+        if self._cohort is None:
+            store = getattr(self.storage, 'store', None)
+            self._cohort = cohort_stats(store.observations()) if store is not None else {}
+        with profiler.span('anomaly_fit', rows=len(self.store)):
+            self._anomaly = AnomalyDetector(self._cohort)
+            return self._anomaly.fit(self.df)
+    
+    def show_anomalies(self, anomalies):
+        """Вывести аномальные значения"""
+        for row in anomalies.itertuples(index=False):
+            print(f"⚠️  {row.date:%d.%m.%Y} {self.get_metric_name(row.metric)}: "
+                  f"{row.value:.2f} (медиана {row.median:.2f}) - {row.reason}")
+    
+    @instrumented('update_values', 'write')
+    def update_values(self, date, values):
+        """Исправить измерения за дату {показатель: значение}
+        
+        Пересчитываются только расчетные показатели, зависящие от исправленных,
+        и только в строках этой даты. Все значения проверяются до изменений:
+        при ошибке (ValueError) таблица и файл остаются прежними.
+        """
+        date = pd.Timestamp(date)
+        lo, hi = self.store.window(date, date)
+        if lo == hi:
+            raise KeyError(f"Нет измерений за {date:%d.%m.%Y}")
+        corrected = {}
+        for metric, value in values.items():
+            if metric in self.derived.metrics:
+                raise ValueError(f"{metric} рассчитывается автоматически")
+            if metric not in self.reference_ranges:
+                raise ValueError(f"Неизвестный показатель: {metric}")
+            try:
+                corrected[metric] = np.nan if value is None else float(value)
+            except (ValueError, TypeError):
+                raise ValueError(f"{metric}: значение должно быть числом") from None
+        
+        rows = np.arange(lo, hi)
+        for metric, value in corrected.items():
+            self.store.add_column(metric)
+            self.store.set_values(rows, metric, np.full(len(rows), value))
+        self.derived.apply_store(self.store, rows, corrected)
+        
+        # Журнал переносится первым - исправляемые строки уже в хранилище
+        with self.journal.lock():
+            self.journal.checkpoint(self.storage)
+            self.storage.update(self.df.iloc[lo:hi])
+        
+        # Исправление не меняет число строк - тренды пересчитываются явно
+        self.trends.reset()
+        self._on_data_changed()
+        print(f"✏️  Исправлено измерений за {date:%d.%m.%Y}: {len(rows)}")
+    
+    @instrumented('checkpoint', 'write')
+    def checkpoint(self):
+        """Перенести журнал новых измерений в хранилище"""
+        return self.journal.checkpoint(self.storage)
+    
+    @instrumented('import_lab_file', 'append')
+    def import_lab_file(self, path, chunksize=1000, dayfirst=False, **read_options):
+        """Потоковый импорт CSV/XLSX выгрузки лаборатории"""
+        from lab_import import import_lab_file
+        return import_lab_file(self, path, chunksize=chunksize, dayfirst=dayfirst, **read_options)
+    
     def input_float(self, prompt):
         try:
             value = input(prompt)
@@ -141,11 +469,8 @@ class DogMedicalTracker:
         new_data['Glucose_urine'] = self.input_float("Глюкоза в моче: ")
         new_data['Casts'] = self.input_float("Цилиндры (в поле зрения): ")
         
-        # Добавляем в DataFrame
-        self.df = pd.concat([self.df, pd.DataFrame([new_data])], ignore_index=True)
-        self.df['date'] = pd.to_datetime(self.df['date'])
-        self.df = self.df.sort_values('date')
-        self.save_data()
+        # Добавляем в DataFrame и хранилище
+        self.append_measurements([new_data])
         print("✅ Показатели успешно добавлены!")
     
     def get_units(self, metric):
@@ -160,7 +485,10 @@ class DogMedicalTracker:
             'UPC_ratio': 'UPC', 
             'Leukocytes_urine': 'в п/з', 'Glucose_urine': '', 'Casts': 'в п/з'
         }
-        return units.get(metric, '')
+        if metric in units:
+            return units[metric]
+        derived = self.derived.metrics.get(metric)
+        return derived.units if derived else ''
     
     def get_metric_name(self, metric):
         """Получить читаемое название показателя"""
@@ -176,10 +504,34 @@ class DogMedicalTracker:
             'UPC_ratio': 'Соотн. Б/К (UPC)', 'Leukocytes_urine': 'Лейкоциты мочи',
             'Glucose_urine': 'Глюкоза мочи', 'Casts': 'Цилиндры'
         }
-        return names.get(metric, metric)
+        if metric in names:
+            return names[metric]
+        derived = self.derived.metrics.get(metric)
+        return derived.title if derived else metric
     
-    def show_transposed_table(self):
-        """Показать таблицу: показатели → строки, даты → столбцы"""
+    def pivot_view(self):
+        """Транспонированная таблица: собирается один раз, дополняется при добавлении"""
+        if self._pivot is None:
+            with profiler.span('pivot_build', rows=len(self.store)):
+                self._pivot = PivotView.from_frame(
+                    self.df, lambda idx: f"{self.get_metric_name(idx)} ({self.get_units(idx)})")
+        return self._pivot
+    
+    def _render_pivot(self, metrics, last=None, start=None, end=None):
+        """Окно транспонированной таблицы с отметками ↑/↓ из сетки статусов"""
+        codes = self.status_grid().columns(metrics)
+        return self.pivot_view().render(metrics, codes, last=last, start=start, end=end)
+    
+    def _print_window_info(self, table):
+        if table.shape[1] < len(self.df):
+            print(f"👁️  Показано визитов: {table.shape[1]} из {len(self.df)}")
+    
+    @instrumented('show_transposed_table')
+    def show_transposed_table(self, last=None, start=None, end=None):
+        """Показать таблицу: показатели → строки, даты → столбцы
+        
+        last - только последние N визитов, start/end - диапазон дат.
+        """
         if len(self.df) == 0:
             print("📭 Нет данных для отображения")
             return
@@ -187,32 +539,21 @@ class DogMedicalTracker:
         print("\n📊 ТАБЛИЦА ПОКАЗАТЕЛЕЙ (по датам)")
         print("=" * 100)
         
-        # Создаем транспонированную таблицу
-        transposed_df = self.df.set_index('date').T
-        
-        # Форматируем даты в названиях столбцов
-        transposed_df.columns = [col.strftime('%d.%m.%Y') for col in transposed_df.columns]
-        
-        # Добавляем единицы измерения к названиям строк
-        transposed_df.index = [f"{self.get_metric_name(idx)} ({self.get_units(idx)})" 
-                             for idx in transposed_df.index]
-        
-        # Округляем значения
-        transposed_df = transposed_df.round(3)
-        
-        # Заменяем NaN на прочерки
-        transposed_df = transposed_df.fillna('-')
+        # Берем окно из готовой транспонированной таблицы
+        transposed_df = self._render_pivot(self.pivot_view().metrics, last, start, end)
         
         # Выводим таблицу
         pd.set_option('display.max_rows', None)
         pd.set_option('display.width', 1000)
         
         print(transposed_df)
+        self._print_window_info(transposed_df)
         
         print(f"\n📈 Всего измерений: {len(self.df)}")
         print(f"📅 Период: {self.df['date'].min().strftime('%d.%m.%Y')} - {self.df['date'].max().strftime('%d.%m.%Y')}")
     
-    def show_key_metrics_table(self):
+    @instrumented('show_key_metrics_table')
+    def show_key_metrics_table(self, last=None, start=None, end=None):
         """Показать таблицу только ключевых показателей"""
         if len(self.df) == 0:
             print("📭 Нет данных для отображения")
@@ -224,8 +565,9 @@ class DogMedicalTracker:
         # Ключевые показатели для мониторинга
         key_metrics = [
             'Creatinine_blood', 'Urea', 'Phosphorus', 'SDMA',  # Почки
+            'BUN_creatinine', 'CaxP',  # Расчетные почечные
             'Protein_urine', 'UPC_ratio', 'Creatinine_urine', 'USG',  # Моча
-            'Lipase', 'ALT', 'Albumin',  # Поджелудочная/печень
+            'Lipase', 'ALT', 'Albumin', 'AG_ratio',  # Поджелудочная/печень
             'Potassium', 'iCalcium'  # Электролиты
         ]
         
@@ -237,94 +579,42 @@ class DogMedicalTracker:
             return
         
         # Создаем таблицу только с ключевыми показателями
-        key_df = self.df[['date'] + existing_metrics].set_index('date').T
-        
-        # Форматируем даты
-        key_df.columns = [col.strftime('%d.%m.%Y') for col in key_df.columns]
-        
-        # Добавляем названия и единицы измерений
-        key_df.index = [f"{self.get_metric_name(idx)} ({self.get_units(idx)})" 
-                       for idx in key_df.index]
-        
-        # Округляем и заменяем NaN
-        key_df = key_df.round(3).fillna('-')
+        key_df = self._render_pivot(existing_metrics, last, start, end)
         
         # Выводим таблицу
         pd.set_option('display.max_rows', None)
         print(key_df)
+        self._print_window_info(key_df)
     
-    def plot_proteinuria_dashboard(self):
-        """Дашборд для мониторинга proteinuria"""
+    @instrumented('plot_proteinuria_dashboard')
+    def plot_proteinuria_dashboard(self, output_path=None, fmt=None, use_cache=True):
+        """Дашборд для мониторинга proteinuria
+        
+        Без output_path - окно matplotlib; с output_path - PNG/SVG без дисплея
+        (Agg) с кэшем готовых картинок рядом с файлом данных.
+        """
         if len(self.df) < 1:
             print("❌ Нет данных для построения графиков")
             return
         
-        fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+        # matplotlib грузится только при открытии дашборда
+        from dashboard import draw_dashboard, render_dashboard
         
-        # 1. Соотношение UPC
-        if 'UPC_ratio' in self.df.columns:
-            ax = axes[0, 0]
-            upc_values = self.df['UPC_ratio'].dropna()
-            if len(upc_values) > 0:
-                ax.plot(self.df['date'], self.df['UPC_ratio'], 
-                       marker='o', linewidth=3, color='red', label='UPC')
-                
-                # Зоны UPC
-                ax.axhspan(0, 0.5, alpha=0.3, color='green', label='Норма (0-0.5)')
-                ax.axhspan(0.5, 1.0, alpha=0.3, color='yellow', label='Пограничная (0.5-1.0)')
-                ax.axhspan(1.0, 2.0, alpha=0.3, color='orange', label='Proteinuria (1.0-2.0)')
-                ax.axhspan(2.0, max(upc_values.max()*1.1, 3.0), alpha=0.3, color='red', label='Тяжелая (>2.0)')
-                
-                ax.set_title('📊 Соотношение БЕЛОК/КРЕАТИНИН (UPC)')
-                ax.set_ylabel('UPC ratio')
-                ax.legend()
-                ax.grid(True, alpha=0.3)
-                ax.tick_params(axis='x', rotation=45)
-        
-        # 2. Белок мочи в мг/дл
-        if 'Protein_urine' in self.df.columns:
-            ax = axes[0, 1]
-            protein_values = self.df['Protein_urine'].dropna()
-            if len(protein_values) > 0:
-                ax.plot(self.df['date'], self.df['Protein_urine'], 
-                       marker='D', linewidth=2, color='purple', label='Белок мочи')
-                ax.axhspan(0, 30, alpha=0.3, color='green', label='Норма (0-30 мг/дл)')
-                ax.set_title('💧 Белок в моче')
-                ax.set_ylabel('мг/дл')
-                ax.legend()
-                ax.grid(True, alpha=0.3)
-                ax.tick_params(axis='x', rotation=45)
-        
-        # 3. Креатинин мочи в мг/дл
-        if 'Creatinine_urine' in self.df.columns:
-            ax = axes[1, 0]
-            creat_values = self.df['Creatinine_urine'].dropna()
-            if len(creat_values) > 0:
-                ax.plot(self.df['date'], self.df['Creatinine_urine'], 
-                       marker='^', linewidth=2, color='green', label='Креатинин мочи')
-                ax.axhspan(50, 250, alpha=0.3, color='green', label='Норма (50-250 мг/дл)')
-                ax.set_title('💧 Креатинин мочи')
-                ax.set_ylabel('мг/дл')
-                ax.legend()
-                ax.grid(True, alpha=0.3)
-                ax.tick_params(axis='x', rotation=45)
-        
-        # 4. Удельный вес мочи
-        if 'USG' in self.df.columns:
-            ax = axes[1, 1]
-            ax.plot(self.df['date'], self.df['USG'], 
-                   marker='v', linewidth=2, color='brown', label='Удельный вес')
-            ax.axhspan(1.015, 1.045, alpha=0.3, color='green', label='Норма (1.015-1.045)')
-            ax.set_title('💧 Удельный вес мочи (USG)')
-            ax.set_ylabel('USG')
-            ax.legend()
-            ax.grid(True, alpha=0.3)
-            ax.tick_params(axis='x', rotation=45)
-        
-        plt.suptitle('🐕 МОНИТОРИНГ ПОЧЕЧНОЙ ФУНКЦИИ', fontsize=16)
-        plt.tight_layout()
+        if output_path is not None:
+            cache_dir = self.dashboard_cache_dir if use_cache else None
+            rendered = render_dashboard(self.df, output_path, fmt=fmt, cache_dir=cache_dir,
+                                        cache_name=self.dashboard_cache_name)
+            print(f"🖼️  Дашборд {'сохранен' if rendered else 'взят из кэша'}: {output_path}")
+            return output_path
+        
+        import matplotlib.pyplot as plt
+        plt.rcParams['font.family'] = 'DejaVu Sans'
+        
+        fig = plt.figure(figsize=(15, 14))
+        draw_dashboard(fig, self.df)
         plt.show()
 
+    @instrumented('show_proteinuria_analysis')
     def show_proteinuria_analysis(self):
         """Детальный анализ proteinuria"""
         if len(self.df) == 0:
@@ -338,34 +628,30 @@ class DogMedicalTracker:
         
         if 'UPC_ratio' in latest and not pd.isna(latest['UPC_ratio']):
             upc = latest['UPC_ratio']
-            
-            if upc < 0.5:
-                stage = "НОРМА"
-                recommendation = "✅ Отличный показатель!"
-            elif upc < 1.0:
-                stage = "ПОГРАНИЧНАЯ"
-                recommendation = "⚠️ Требуется наблюдение, возможно назначение ИАПФ"
-            elif upc < 2.0:
-                stage = "PROTEINURIA" 
-                recommendation = "🚨 Рекомендованы ИАПФ, контроль каждые 2-4 недели"
-            else:
-                stage = "ТЯЖЕЛАЯ PROTEINURIA"
-                recommendation = "🚨 СРОЧНАЯ КОНСУЛЬТАЦИЯ ВЕТЕРИНАРА!"
+            stage = self.rules.label('upc', upc)
             
             print(f"📊 Соотношение БЕЛОК/КРЕАТИНИН (UPC): {upc:.2f}")
-            print(f"🎯 Стадия: {stage}")
-            print(f"💡 Рекомендация: {recommendation}")
+            if stage is None:
+                print("🎯 Стадия: вне классификации")
+            else:
+                print(f"🎯 Стадия: {stage.upper()}")
+                print(f"💡 Рекомендация: {self.upc_recommendations[stage]}")
             print()
         
         # Дополнительная информация
         urine_metrics = ['Protein_urine', 'Creatinine_urine', 'USG']
+        grid = self.status_grid('reference')
         for metric in urine_metrics:
-            if metric in latest and not pd.isna(latest[metric]):
+            code = grid.latest(metric)
+            if code != MISSING:
                 value = latest[metric]
                 low, high = self.reference_ranges[metric]
-                status = "✅ В норме" if low <= value <= high else "❌ Отклонение"
+                status = "✅ В норме" if code == IN_RANGE else "❌ Отклонение"
                 print(f"{metric}: {value:.1f} {self.get_units(metric)} (норма: {low}-{high}) - {status}")
+        
+        self.show_trends(['UPC_ratio'])
 
+    @instrumented('show_ckd_analysis')
     def show_ckd_analysis(self):
         """Специальный анализ для ХБП 3 стадии"""
         if len(self.df) == 0:
@@ -377,25 +663,39 @@ class DogMedicalTracker:
         print("\n🔍 АНАЛИЗ ХБП 3 СТАДИИ")
         print("=" * 60)
         
-        ckd_metrics = {
-            'Creatinine_blood': (180, 440),
-            'Urea': (10, 25),
-            'Phosphorus': (1.6, 3.0),
-            'SDMA': (18, 35)
+        stage_labels = {
+            BELOW: "⬇️  Ниже диапазона 3 стадии",
+            IN_RANGE: "🎯 В диапазоне 3 стадии",
+            ABOVE: "⬆️  Выше диапазона 3 стадии",
         }
         
-        for metric, (stage_min, stage_max) in ckd_metrics.items():
-            if metric in latest and not pd.isna(latest[metric]):
+        grid = self.status_grid('ckd')
+        for metric in self.ckd_stage_ranges:
+            code = grid.latest(metric)
+            if code != MISSING:
                 value = latest[metric]
-                
-                if value < stage_min:
-                    status = "⬇️  Ниже диапазона 3 стадии"
-                elif value <= stage_max:
-                    status = "🎯 В диапазоне 3 стадии"
-                else:
-                    status = "⬆️  Выше диапазона 3 стадии"
+                status = stage_labels[code]
                 
                 print(f"{metric}: {value:.1f} {self.get_units(metric)} - {status}")
+        
+        self.show_trends(['Creatinine_blood', 'SDMA', 'Phosphorus'])
+
+    def show_trends(self, metrics):
+        """Динамика показателей из накопленных агрегатов (без пересчета истории)"""
+        summary = self.trends.summary(metrics)
+        if len(summary) == 0:
+            return
+        
+        print("\n📈 ДИНАМИКА")
+        for metric, row in summary.iterrows():
+            units = self.get_units(metric)
+            line = f"{metric}: EWMA {row['ewma']:.2f} {units}"
+            if not pd.isna(row['slope_30d']):
+                arrow = "⬆️" if row['slope_30d'] > 0 else "⬇️"
+                line += f", тренд {arrow} {row['slope_30d']:+.2f} за 30 дней"
+                if not pd.isna(row['rate_per_day']):
+                    line += f", последнее изменение {row['rate_per_day']:+.3f}/день"
+            print(f"{line} (измерений: {int(row['count'])})")
 
     def show_all_data(self):
         """Показать все данные в разных форматах"""
@@ -422,14 +722,53 @@ class DogMedicalTracker:
             print(display_df)
             
         elif choice == '2':
-            self.show_transposed_table()
+            self.show_transposed_table(last=self._ask_last_visits())
             
         elif choice == '3':
-            self.show_key_metrics_table()
+            self.show_key_metrics_table(last=self._ask_last_visits())
             
         else:
             print("❌ Неверный выбор")
 
+    @instrumented('show_period_summary')
+    def show_period_summary(self, metrics=None, freq='M', start=None, end=None):
+        """Сводка показателей по месяцам/кварталам из готовых агрегатов"""
+        if len(self.df) == 0:
+            print("📭 Нет данных")
+            return
+        
+        metrics = metrics or ['Creatinine_blood', 'Urea', 'Phosphorus', 'SDMA', 'UPC_ratio']
+        buckets = self.time_buckets(freq)
+        print(f"\n📅 СВОДКА ПО {FREQUENCIES[freq].upper()}")
+        print("=" * 60)
+        
+        for metric in metrics:
+            if metric not in buckets.metrics:
+                continue
+            summary = buckets.summary(metric, start, end)
+            if len(summary) == 0:
+                continue
+            summary.columns = ['измерений', 'среднее', 'мин', 'макс']
+            summary.index.name = None
+            print(f"\n{self.get_metric_name(metric)} ({self.get_units(metric)})")
+            print(summary.round(3))
+    
+    def _ask_date(self, prompt):
+        """Дата из ввода (None - без ограничения)"""
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            return pd.Timestamp(value)
+        except ValueError:
+            print("❌ Неверная дата - без ограничения")
+            return None
+    
+    def _ask_last_visits(self):
+        """Сколько последних визитов показать (None - все)"""
+        value = input("Сколько последних визитов показать (Enter - все): ").strip()
+        return int(value) if value.isdigit() and int(value) > 0 else None
+
     def show_main_menu(self):
         """Главное меню системы"""
         while True:
@@ -441,9 +780,13 @@ class DogMedicalTracker:
             print("3. 🔍 Анализ ХБП 3 стадии") 
             print("4. 📋 Анализ PROTEINURIA")
             print("5. 📄 Показать все данные (таблицы)")
-            print("6. 🚪 Выход")
+            print("6. 📥 Импорт выгрузки лаборатории (CSV/XLSX)")
+            print("7. 📤 Экспорт в Excel")
+            print("8. 📅 Сводка по месяцам/кварталам")
+            print("9. ⚠️  Аномалии (своя история и когорта)")
+            print("10. 🚪 Выход")
             
-            choice = input("\nВаш выбор (1-6): ")
+            choice = input("\nВаш выбор (1-10): ")
             
             if choice == '1':
                 self.add_measurement()
@@ -456,6 +799,25 @@ class DogMedicalTracker:
             elif choice == '5':
                 self.show_all_data()
             elif choice == '6':
+                path = input("Путь к файлу выгрузки: ").strip()
+                if os.path.exists(path):
+                    self.import_lab_file(path)
+                else:
+                    print("❌ Файл не найден")
+            elif choice == '7':
+                self.export_excel()
+            elif choice == '8':
+                freq = 'Q' if input("По кварталам? (д/Н): ").strip().lower() in ('д', 'y') else 'M'
+                start = self._ask_date("Период с (ГГГГ-ММ-ДД, Enter - с начала): ")
+                end = self._ask_date("Период по (ГГГГ-ММ-ДД, Enter - до конца): ")
+                self.show_period_summary(freq=freq, start=start, end=end)
+            elif choice == '9':
+                anomalies = self.find_anomalies()
+                if len(anomalies) == 0:
+                    print("✅ Аномалий не найдено")
+                self.show_anomalies(anomalies)
+            elif choice == '10':
+                self.checkpoint()
                 print("💝 Забота о питомце - это важно! Данные сохранены.")
                 break
             else:
@@ -464,5 +826,28 @@ class DogMedicalTracker:
 # Запуск системы
 if __name__ == "__main__":
     print("🐕 Запуск системы мониторинга для собаки с ХБП и панкреатитом...")
-    tracker = DogMedicalTracker()
-    tracker.show_main_menu()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Мониторинг собаки с ХБП и панкреатитом")
+    parser.add_argument('--store', help='каталог хранилища клиники (много пациентов)')
+    parser.add_argument('--patient', help='ID пациента в хранилище клиники')
+    parser.add_argument('--dashboard', metavar='PATH', help='сохранить дашборд в PNG/SVG и выйти')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help='профиль сессии при выходе (в stderr или FILE)')
+    args = parser.parse_args()
+    
+    if args.profile:
+        profiler.enable_session_report(None if args.profile == '-' else args.profile)
+    
+    if args.store:
+        from patient_store import PatientStore
+        if not args.patient:
+            parser.error('для --store нужен --patient')
+        tracker = PatientStore(args.store).tracker(args.patient)
+    else:
+        # История хранится в SQLite, старая рабочая книга импортируется один раз
+        storage = SQLiteStorage('dog_medical_data.db', import_from='dog_medical_data.xlsx')
+        tracker = DogMedicalTracker(storage=storage)
+    
+    if args.dashboard:
+        tracker.plot_proteinuria_dashboard(output_path=args.dashboard)
+    else:
+        tracker.show_main_menu()
\ No newline at end of file
@@ -0,0 +1,217 @@
+# patient_store.py - Хранилище клиники: много пациентов, один шард на собаку
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from storage import SQLiteStorage
+
+
+class PatientStorage(SQLiteStorage):
+    """Шард одного пациента - каждая запись дублируется в общий индекс клиники"""
+
+    def __init__(self, store, patient_id, path):
+        super().__init__(path)
+        self.store = store
+        self.patient_id = patient_id
+
+    def save(self, df, meta=None):
+        super().save(df, meta)
+        self.store.reindex(self.patient_id, df)
+
+    def append(self, df, meta=None):
+        super().append(df, meta)
+        self.store.index_rows(self.patient_id, df)
+
+    def update(self, df, meta=None):
+        super().update(df, meta)
+        # Таблица читается через уже открытый шард
+        self.store.reindex(self.patient_id, self.load())
+
+
+class PatientStore:
+    """Каталог с шардами пациентов и индексом для запросов по всей клинике
+
+    Раскладка:
+        <root>/index.db              - пациенты + показатели в длинном формате
+        <root>/shards/ab/<id>-<hash>.db - история одной собаки (SQLite)
+
+    История одной собаки читается из ее шарда, поэтому загрузка стоит
+    O(записей этой собаки) при любом размере клиники. Запросы вида
+    "все собаки с UPC_ratio > 2.0 за 30 дней" идут по индексу
+    (metric, date, value) и не открывают шарды.
+    """
+
+    OPERATORS = ('>', '>=', '<', '<=', '=')
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'shards'), exist_ok=True)
+        # Сервис обращается к хранилищу из потока записи
+        self.index = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        with self.index:
+            self.index.execute(
+                'CREATE TABLE IF NOT EXISTS patients ('
+                'patient_id TEXT PRIMARY KEY, shard TEXT NOT NULL, '
+                'rows INTEGER NOT NULL DEFAULT 0, first_date TEXT, last_date TEXT)'
+            )
+            self.index.execute(
+                'CREATE TABLE IF NOT EXISTS observations ('
+                'patient_id TEXT NOT NULL, date TEXT NOT NULL, '
+                'metric TEXT NOT NULL, value REAL NOT NULL)'
+            )
+            self.index.execute(
+                'CREATE INDEX IF NOT EXISTS idx_obs_metric '
+                'ON observations (metric, date, value)'
+            )
+            self.index.execute(
+                'CREATE INDEX IF NOT EXISTS idx_obs_patient '
+                'ON observations (patient_id, date)'
+            )
+
+    def close(self):
+        self.index.close()
+
+    def _shard_relpath(self, patient_id):
+        digest = hashlib.sha1(patient_id.encode('utf-8')).hexdigest()
+        safe_id = re.sub(r'[^\w.-]', '_', patient_id)[:40]
+        return os.path.join('shards', digest[:2], f'{safe_id}-{digest[:8]}.db')
+
+    def patients(self):
+        """Список пациентов с числом записей и периодом наблюдения"""
+        return pd.read_sql_query(
+            'SELECT patient_id, rows, first_date, last_date FROM patients ORDER BY patient_id',
+            self.index
+        )
+
+    def shard_path(self, patient_id):
+        """Путь к шарду пациента (None, если пациента нет)"""
+        row = self.index.execute(
+            'SELECT shard FROM patients WHERE patient_id = ?', (patient_id,)
+        ).fetchone()
+        return os.path.join(self.root, row[0]) if row else None
+
+    def storage(self, patient_id):
+        """Хранилище одного пациента (создается при первом обращении)"""
+        row = self.index.execute(
+            'SELECT shard FROM patients WHERE patient_id = ?', (patient_id,)
+        ).fetchone()
+        if row is None:
+            relpath = self._shard_relpath(patient_id)
+            with self.index:
+                self.index.execute(
+                    'INSERT INTO patients (patient_id, shard) VALUES (?, ?)',
+                    (patient_id, relpath)
+                )
+        else:
+            relpath = row[0]
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return PatientStorage(self, patient_id, path)
+
+    def tracker(self, patient_id, **kwargs):
+        """Трекер для одного пациента из хранилища клиники"""
+        from medical_tracker import DogMedicalTracker
+        return DogMedicalTracker(storage=self.storage(patient_id), **kwargs)
+
+    def _observation_rows(self, patient_id, df):
+        """Строки индекса: только заполненные значения показателей"""
+        metrics = [col for col in df.columns if col != 'date']
+        long_df = df.melt(id_vars='date', value_vars=metrics, var_name='metric')
+        long_df = long_df.dropna(subset=['value'])
+        dates = pd.to_datetime(long_df['date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        return zip([patient_id] * len(long_df), dates, long_df['metric'],
+                   long_df['value'].astype(float))
+
+    def _update_patient_summary(self, patient_id, rows, replace):
+        counter = '?' if replace else 'rows + ?'
+        self.index.execute(
+            f'UPDATE patients SET rows = {counter}, '
+            'first_date = (SELECT MIN(date) FROM observations WHERE patient_id = ?), '
+            'last_date = (SELECT MAX(date) FROM observations WHERE patient_id = ?) '
+            'WHERE patient_id = ?',
+            (rows, patient_id, patient_id, patient_id)
+        )
+
+    def index_rows(self, patient_id, df):
+        """Добавить новые строки пациента в индекс"""
+        with self.index:
+            self.index.executemany(
+                'INSERT INTO observations (patient_id, date, metric, value) VALUES (?, ?, ?, ?)',
+                self._observation_rows(patient_id, df)
+            )
+            self._update_patient_summary(patient_id, len(df), replace=False)
+
+    def reindex(self, patient_id, df=None):
+        """Перестроить индекс пациента по его шарду (или переданной таблице)"""
+        if df is None:
+            storage = self.storage(patient_id)
+            try:
+                df = storage.load()
+            finally:
+                storage.close()
+        with self.index:
+            self.index.execute('DELETE FROM observations WHERE patient_id = ?', (patient_id,))
+            self.index.executemany(
+                'INSERT INTO observations (patient_id, date, metric, value) VALUES (?, ?, ?, ?)',
+                self._observation_rows(patient_id, df)
+            )
+            self._update_patient_summary(patient_id, len(df), replace=True)
+
+    def query(self, metric, op, value, since=None, until=None, days=None):
+        """Все измерения показателя по клинике, удовлетворяющие условию
+
+        Пример: store.query('UPC_ratio', '>', 2.0, days=30)
+        """
+        if op not in self.OPERATORS:
+            raise ValueError(f"Неизвестный оператор: {op}")
+        if days is not None:
+            since = datetime.now() - timedelta(days=days)
+
+        sql = f'SELECT patient_id, date, value FROM observations WHERE metric = ? AND value {op} ?'
+        params = [metric, float(value)]
+        if since is not None:
+            sql += ' AND date >= ?'
+            params.append(pd.Timestamp(since).strftime('%Y-%m-%d %H:%M:%S'))
+        if until is not None:
+            sql += ' AND date <= ?'
+            params.append(pd.Timestamp(until).strftime('%Y-%m-%d %H:%M:%S'))
+        sql += ' ORDER BY patient_id, date'
+
+        result = pd.read_sql_query(sql, self.index, params=params)
+        result['date'] = pd.to_datetime(result['date'])
+        return result
+
+    def observations(self, metrics=None):
+        """Все значения клиники в длинном формате (patient_id, date, metric, value)"""
+        sql = 'SELECT patient_id, date, metric, value FROM observations'
+        params = []
+        if metrics:
+            sql += f' WHERE metric IN ({", ".join("?" * len(metrics))})'
+            params = list(metrics)
+        result = pd.read_sql_query(sql, self.index, params=params)
+        result['date'] = pd.to_datetime(result['date'], format='%Y-%m-%d %H:%M:%S')
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запрос по всем пациентам клиники")
+    parser.add_argument('root', help='каталог хранилища клиники')
+    parser.add_argument('metric', help='показатель, например UPC_ratio')
+    parser.add_argument('op', choices=PatientStore.OPERATORS)
+    parser.add_argument('value', type=float)
+    parser.add_argument('--days', type=int, help='только за последние N дней')
+    args = parser.parse_args()
+
+    store = PatientStore(args.root)
+    result = store.query(args.metric, args.op, args.value, days=args.days)
+    if len(result) == 0:
+        print("📭 Совпадений нет")
+    else:
+        pd.set_option('display.max_rows', None)
+        print(result)
+        print(f"\n🐕 Пациентов: {result['patient_id'].nunique()}")
@@ -0,0 +1,102 @@
+# pivot_view.py - Материализованная транспонированная таблица (показатели × даты)
+import numpy as np
+import pandas as pd
+
+from status import BELOW, ABOVE
+
+
+class PivotView:
+    """Числа, подписи строк и дат транспонированной таблицы, собранные один раз
+
+    Новые измерения дописываются столбцами в буфер с запасом (O(новых)),
+    строки текста собираются только для показываемого окна дат.
+    """
+
+    def __init__(self, metrics, label_func, capacity=16):
+        self.metrics = list(metrics)
+        self.row_labels = [label_func(metric) for metric in self.metrics]
+        self._rows = {metric: i for i, metric in enumerate(self.metrics)}
+        self.size = 0
+        self._values = np.full((len(self.metrics), capacity), np.nan)
+        self._dates = np.empty(capacity, dtype='datetime64[ns]')
+        self.date_labels = []
+
+    @classmethod
+    def from_frame(cls, df, label_func):
+        metrics = [col for col in df.columns if col != 'date']
+        view = cls(metrics, label_func, capacity=max(16, len(df)))
+        view.append(df)
+        return view
+
+    @property
+    def dates(self):
+        return self._dates[:self.size]
+
+    def can_append(self, df):
+        """Новые строки можно дописать, не пересобирая таблицу"""
+        if any(col not in self._rows for col in df.columns if col != 'date'):
+            return False
+        dates = pd.to_datetime(df['date'])
+        if not dates.is_monotonic_increasing:
+            return False
+        return self.size == 0 or dates.iloc[0] >= self._dates[self.size - 1]
+
+    def _reserve(self, extra):
+        capacity = self._values.shape[1]
+        if self.size + extra <= capacity:
+            return
+        # Рост с запасом - амортизированно O(1) на столбец
+        new_capacity = max(capacity * 2, self.size + extra)
+        values = np.full((len(self.metrics), new_capacity), np.nan)
+        values[:, :self.size] = self._values[:, :self.size]
+        dates = np.empty(new_capacity, dtype='datetime64[ns]')
+        dates[:self.size] = self._dates[:self.size]
+        self._values, self._dates = values, dates
+
+    def append(self, df):
+        count = len(df)
+        if count == 0:
+            return
+        self._reserve(count)
+        end = self.size + count
+        for col in df.columns:
+            if col != 'date':
+                self._values[self._rows[col], self.size:end] = df[col].to_numpy(dtype=float, na_value=np.nan)
+        dates = pd.to_datetime(df['date'])
+        self._dates[self.size:end] = dates.to_numpy(dtype='datetime64[ns]')
+        self.date_labels.extend(dates.dt.strftime('%d.%m.%Y'))
+        self.size = end
+
+    def window(self, last=None, start=None, end=None):
+        """Границы столбцов [lo, hi) для последних N визитов и/или диапазона дат"""
+        lo, hi = 0, self.size
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left'))
+        if end is not None:
+            hi = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right'))
+        if last is not None:
+            lo = max(lo, hi - last)
+        return lo, max(lo, hi)
+
+    def render(self, metrics=None, codes=None, last=None, start=None, end=None):
+        """Текстовая таблица для окна: округление, ↑/↓ по сетке статусов, прочерки
+
+        codes - сетка статусов (даты × metrics) за всю историю.
+        """
+        metrics = self.metrics if metrics is None else list(metrics)
+        lo, hi = self.window(last, start, end)
+        rows = [self._rows[metric] for metric in metrics]
+
+        values = self._values[rows, lo:hi].round(3)
+        cells = values.astype(str).astype(object)
+        if codes is not None:
+            window_codes = codes[lo:hi].T
+            cells[window_codes == ABOVE] += '↑'
+            cells[window_codes == BELOW] += '↓'
+        cells[np.isnan(values)] = '-'
+
+        return pd.DataFrame(
+            cells,
+            index=[self.row_labels[i] for i in rows],
+            columns=self.date_labels[lo:hi]
+        )
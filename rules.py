@@ -0,0 +1,134 @@
+# rules.py - Классы показателей по таблицам интервалов и оповещения о переходах
+import numpy as np
+import pandas as pd
+
+EVENT_COLUMNS = ['date', 'rule', 'metric', 'value', 'previous', 'label']
+
+
+class IntervalIndex:
+    """Таблица классов, собранная в отсортированные левые границы интервалов
+
+    Интервал i - [edges[i], edges[i+1]), его класс - bins[i] (-1 - разрыв
+    между классами). Класс значения ищется бинарным поиском (np.searchsorted)
+    сразу для целого столбца; пропуски и значения вне таблицы получают -1.
+    """
+
+    def __init__(self, edges, bins, labels):
+        self.edges = np.asarray(edges, dtype=float)
+        self.bins = np.asarray(bins, dtype=np.int8)
+        self.labels = list(labels)
+        if np.any(np.diff(self.edges) <= 0):
+            raise ValueError("Границы интервалов должны строго возрастать")
+        # Метка по коду; код -1 попадает на последний элемент - None
+        self._label_array = np.array(self.labels + [None], dtype=object)
+
+    @classmethod
+    def from_classes(cls, classes):
+        """{класс: (от, до)} с интервалами [от, до), как у классификации UPC"""
+        edges, bins, labels = [], [], []
+        prev_high = None
+        for label, (low, high) in sorted(classes.items(), key=lambda item: item[1][0]):
+            if prev_high is not None and low < prev_high:
+                raise ValueError(f"Класс '{label}' пересекается с предыдущим")
+            if prev_high is not None and low > prev_high:
+                edges.append(prev_high)
+                bins.append(-1)
+            edges.append(low)
+            bins.append(len(labels))
+            labels.append(label)
+            prev_high = high
+        if prev_high is not None and np.isfinite(prev_high):
+            edges.append(prev_high)
+            bins.append(-1)
+        return cls(edges, bins, labels)
+
+    @classmethod
+    def from_range(cls, low, high, labels=('ниже', 'в диапазоне', 'выше')):
+        """Диапазон [low, high] с включительными границами: три класса"""
+        # Верхняя граница включительная - класс "выше" начинается сразу за ней
+        return cls([-np.inf, low, np.nextafter(high, np.inf)], [0, 1, 2], labels)
+
+    def codes(self, values):
+        """Коды классов для массива значений (int8, -1 - вне классов)"""
+        values = np.asarray(values, dtype=float)
+        positions = np.searchsorted(self.edges, values, side='right') - 1
+        inside = (positions >= 0) & ~np.isnan(values)
+        codes = np.full(values.shape, -1, dtype=np.int8)
+        codes[inside] = self.bins[positions[inside]]
+        return codes
+
+    def label_of(self, codes):
+        """Метки по кодам классов (None - вне классов)"""
+        return self._label_array[np.asarray(codes, dtype=np.int8)]
+
+    def classify(self, values):
+        """Метки классов для массива значений"""
+        return self.label_of(self.codes(values))
+
+
+class RuleSet:
+    """Именованные правила: показатель + таблица интервалов + тревожные классы"""
+
+    def __init__(self):
+        self.rules = {}
+
+    def add(self, name, metric, index, alert_on=()):
+        unknown = set(alert_on) - set(index.labels)
+        if unknown:
+            raise ValueError(f"Неизвестные классы для оповещений: {sorted(unknown)}")
+        alert_codes = np.array([index.labels.index(label) for label in alert_on], dtype=np.int8)
+        self.rules[name] = (metric, index, alert_codes)
+
+    def label(self, name, value):
+        """Класс одного значения по правилу name"""
+        return self.rules[name][1].classify([value])[0]
+
+    def evaluate(self, df, names=None):
+        """Коды классов по всей таблице: {правило: массив int8}"""
+        result = {}
+        for name in names or self.rules:
+            metric, index, _ = self.rules[name]
+            result[name] = index.codes(_values(df, metric))
+        return result
+
+    def events(self, df, previous=None):
+        """Переходы в тревожные классы за один проход по таблице
+
+        previous - {правило: код последнего известного класса} до первой
+        строки df: так порции импорта продолжают друг друга. Возвращает
+        (DataFrame событий, состояние для следующей порции).
+        """
+        state = dict(previous or {})
+        dates = df['date'].to_numpy() if len(df) else np.array([], dtype='datetime64[ns]')
+        frames = []
+        for name, (metric, index, alert_codes) in self.rules.items():
+            values = _values(df, metric)
+            codes = index.codes(values)
+            known = np.flatnonzero(codes >= 0)
+            if len(known) == 0:
+                continue
+            sequence = codes[known]
+            before = np.concatenate(([state.get(name, -1)], sequence[:-1])).astype(np.int8)
+            hit = (sequence != before) & np.isin(sequence, alert_codes)
+            state[name] = int(sequence[-1])
+            if not hit.any():
+                continue
+            rows = known[hit]
+            frames.append(pd.DataFrame({
+                'date': dates[rows],
+                'rule': name,
+                'metric': metric,
+                'value': values[rows],
+                'previous': index.label_of(before[hit]),
+                'label': index.label_of(sequence[hit]),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=EVENT_COLUMNS), state
+        events = pd.concat(frames, ignore_index=True)
+        return events.sort_values('date', kind='stable', ignore_index=True), state
+
+
+def _values(df, metric):
+    if metric not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[metric].to_numpy(dtype=float, na_value=np.nan)
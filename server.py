@@ -0,0 +1,401 @@
+# server.py - Локальный HTTP-сервис трекера для нескольких терминалов клиники
+#
+#   GET  /health                          - состояние сервиса
+#   GET  /analysis/ckd                    - анализ ХБП (текст)
+#   GET  /analysis/proteinuria            - анализ proteinuria (текст)
+#   GET  /tables/transposed?last=N        - таблица по датам (start/end - диапазон)
+#   GET  /tables/key?last=N               - ключевые показатели
+#   GET  /dashboard.png | /dashboard.svg  - дашборд
+#   GET  /measurements?last=N             - измерения в JSON
+#   POST /measurements                    - добавить измерение (JSON объект или список)
+#
+# С --store те же пути доступны как /patients/<id>/... для каждого пациента.
+# Чтение идет из общего кэша ответов, запись - через одну очередь писателя:
+# все запросы, накопившиеся за время записи, сохраняются одним пакетом.
+# Запись и отрисовка идут в потоках, цикл событий не блокируется; к одному
+# трекеру в каждый момент обращается только один поток.
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from dashboard import render_dashboard
+
+STATUS_TEXT = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+# Пути, ответ которых зависит от окна дат (last/start/end)
+WINDOW_ROUTES = ('/tables/transposed', '/tables/key', '/measurements')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TrackerService:
+    """Операции трекера поверх asyncio: кэш чтения и один писатель"""
+
+    def __init__(self, get_tracker, max_batch=500, cache_size=128):
+        # get_tracker(patient_id, create) -> DogMedicalTracker (patient_id=None - основной);
+        # нового пациента создает только запись (create=True), чтение - 404
+        self.get_tracker = get_tracker
+        self.max_batch = max_batch
+        # Кэш ответов: ограничен по числу записей, вытесняются давно не читанные
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.stats = {'requests': 0, 'cache_hits': 0, 'commits': 0, 'committed_rows': 0}
+        self._queue = None
+        self._writer = None
+        # Хранилища (SQLite) открываются и пишутся в одном потоке
+        self._io = ThreadPoolExecutor(max_workers=1)
+        self._locks = {}
+
+    async def start(self):
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._writer_loop())
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer
+        self._io.shutdown(wait=True)
+        if isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = sys.stdout.stream
+
+    def _lock(self, patient_id):
+        """Блокировка трекера пациента: трекер не потокобезопасен"""
+        if patient_id not in self._locks:
+            self._locks[patient_id] = asyncio.Lock()
+        return self._locks[patient_id]
+
+    async def _tracker(self, patient_id, create=False):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._io, self.get_tracker, patient_id, create)
+
+    # --- запись ---
+
+    async def add_measurements(self, patient_id, records):
+        """Проверить записи и поставить в очередь писателя
+
+        Ошибки в данных (дата, числа, неизвестные показатели) - 400 сразу,
+        до очереди: один плохой запрос не портит пакет остальных.
+        """
+        tracker = await self._tracker(patient_id, create=True)
+        try:
+            rows = tracker.coerce_measurements(records)
+        except ValueError as error:
+            raise HTTPError(400, str(error))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((patient_id, rows, future))
+        return await future
+
+    async def _writer_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Групповой коммит: забираем все, что успело накопиться
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        by_patient = {}
+        for patient_id, records, future in batch:
+            by_patient.setdefault(patient_id, []).append((records, future))
+
+        loop = asyncio.get_running_loop()
+        for patient_id, items in by_patient.items():
+            frames = [records for records, _ in items]
+            async with self._lock(patient_id):
+                results, commits = await loop.run_in_executor(
+                    self._io, self._commit_patient, patient_id, frames)
+                for key in [key for key in self.cache if key[0] == patient_id]:
+                    del self.cache[key]
+            self.stats['commits'] += commits
+            for (records, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    self.stats['committed_rows'] += len(records)
+                    future.set_result(result)
+
+    def _commit_patient(self, patient_id, frames):
+        """Записать запросы пациента (в потоке записи): ([результат или ошибка], коммитов)"""
+        try:
+            return self._append(patient_id, frames), 1
+        except Exception:
+            # Пакет не записался - повторяем запросы по одному,
+            # ошибка достается только своему запросу
+            results, commits = [], 0
+            for frame in frames:
+                try:
+                    results += self._append(patient_id, [frame])
+                    commits += 1
+                except Exception as error:
+                    results.append(error)
+            return results, commits
+
+    def _append(self, patient_id, frames):
+        rows = pd.concat(frames, ignore_index=True)
+        tracker = self.get_tracker(patient_id, True)
+        _capture(tracker.append_measurements, rows, verbose=False)
+        return [{'added': len(frame), 'rows': len(tracker.store)} for frame in frames]
+
+    # --- чтение ---
+
+    async def read(self, patient_id, route, query):
+        # В ключе только параметры, от которых зависит ответ
+        window = self._window(query) if route in WINDOW_ROUTES else {}
+        key = (patient_id, route, tuple(window.values()))
+        if key in self.cache:
+            self.stats['cache_hits'] += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        # Пока идет отрисовка, писатель этого пациента ждет - ответ не устареет
+        async with self._lock(patient_id):
+            if key in self.cache:
+                return self.cache[key]
+            tracker = await self._tracker(patient_id)
+            response = await self._render(tracker, route, window)
+            self.cache[key] = response
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return response
+
+    def _window(self, query):
+        last = query.get('last', [None])[0]
+        if last is not None and not last.isdigit():
+            raise HTTPError(400, 'last должен быть целым числом')
+        return {
+            'last': int(last) if last else None,
+            'start': query.get('start', [None])[0],
+            'end': query.get('end', [None])[0],
+        }
+
+    async def _render(self, tracker, route, window):
+        # Текстовые отчеты считаются в потоке - цикл событий свободен для других терминалов
+        run = asyncio.get_running_loop().run_in_executor
+        if route == '/analysis/ckd':
+            return _text(await run(None, _capture, tracker.show_ckd_analysis))
+        if route == '/analysis/proteinuria':
+            return _text(await run(None, _capture, tracker.show_proteinuria_analysis))
+        if route in ('/tables/transposed', '/tables/key'):
+            show = tracker.show_transposed_table if route == '/tables/transposed' else tracker.show_key_metrics_table
+            return _text(await run(None, lambda: _capture(show, **window)))
+        if route == '/measurements':
+            df = tracker.df
+            if window['last']:
+                df = df.tail(window['last'])
+            body = await run(None, lambda: df.to_json(orient='records', date_format='iso', force_ascii=False))
+            return 200, 'application/json; charset=utf-8', body.encode('utf-8')
+        if route in ('/dashboard.png', '/dashboard.svg'):
+            if len(tracker.df) == 0:
+                raise HTTPError(404, 'Нет данных для построения графиков')
+            fmt = route.rsplit('.', 1)[1]
+            body = await run(None, _render_image, tracker.df.copy(), fmt,
+                             tracker.dashboard_cache_dir, tracker.dashboard_cache_name)
+            content_type = 'image/png' if fmt == 'png' else 'image/svg+xml'
+            return 200, content_type, body
+        raise HTTPError(404, f'Неизвестный путь: {route}')
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        try:
+            status, content_type, body = await self._dispatch(reader)
+        except HTTPError as error:
+            status, content_type, body = _json(error.status, {'error': str(error)})
+        except Exception as error:
+            status, content_type, body = _json(500, {'error': repr(error)})
+        head = (
+            f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+        with contextlib.suppress(ConnectionError):
+            await writer.drain()
+        writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            raise HTTPError(400, 'Пустой запрос')
+        parts = request_line.split(' ', 2)
+        if len(parts) != 3:
+            raise HTTPError(400, 'Некорректная строка запроса')
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            raise HTTPError(400, 'Некорректный Content-Length')
+        length = int(length)
+        body = await reader.readexactly(length) if length else b''
+
+        self.stats['requests'] += 1
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        patient_id, route = _split_patient(unquote(url.path))
+
+        if route == '/health':
+            return _json(200, {'status': 'ok', **self.stats})
+        if route == '/measurements' and method == 'POST':
+            try:
+                payload = json.loads(body or b'null')
+            except ValueError:
+                raise HTTPError(400, 'Некорректный JSON')
+            records = payload if isinstance(payload, list) else [payload]
+            if not records or not all(isinstance(r, dict) and 'date' in r for r in records):
+                raise HTTPError(400, 'Нужен объект (или список) с полем date')
+            return _json(201, await self.add_measurements(patient_id, records))
+        if method != 'GET':
+            raise HTTPError(405, f'Метод {method} не поддерживается')
+        return await self.read(patient_id, route, query)
+
+
+def _split_patient(path):
+    """/patients/<id>/route -> (id, /route); иначе (None, path)"""
+    parts = path.split('/')
+    if len(parts) > 3 and parts[1] == 'patients':
+        return parts[2], '/' + '/'.join(parts[3:])
+    return None, path
+
+
+class _ThreadStdout:
+    """sys.stdout, который в потоках с перехватом (_capture) пишет в их буфер"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _capture(func, *args, **kwargs):
+    """Вывод функции строкой; потоки с перехватом не мешают друг другу"""
+    out = io.StringIO()
+    stdout = sys.stdout
+    if not isinstance(stdout, _ThreadStdout):
+        with contextlib.redirect_stdout(out):
+            func(*args, **kwargs)
+        return out.getvalue()
+    previous, stdout.local.buffer = getattr(stdout.local, 'buffer', None), out
+    try:
+        func(*args, **kwargs)
+    finally:
+        stdout.local.buffer = previous
+    return out.getvalue()
+
+
+def _text(text):
+    return 200, 'text/plain; charset=utf-8', text.encode('utf-8')
+
+
+def _json(status, data):
+    def default(value):
+        if isinstance(value, (np.integer, np.floating)):
+            return value.item()
+        if isinstance(value, pd.Timestamp):
+            return value.isoformat()
+        raise TypeError(type(value))
+    body = json.dumps(data, ensure_ascii=False, default=default).encode('utf-8')
+    return status, 'application/json; charset=utf-8', body
+
+
+def _render_image(df, fmt, cache_dir, cache_name):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, f'dashboard.{fmt}')
+        render_dashboard(df, path, fmt=fmt, cache_dir=cache_dir, cache_name=cache_name)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def tracker_factory(data_file, store=None):
+    """get_tracker для сервиса: основной трекер по data_file, пациенты - из store
+
+    Трекеры создаются один раз и переиспользуются; нового пациента
+    заводит только запись (create=True).
+    """
+    from medical_tracker import DogMedicalTracker
+    trackers = {}
+
+    def get_tracker(patient_id, create=False):
+        if patient_id not in trackers:
+            if patient_id is None:
+                trackers[None] = DogMedicalTracker(data_file)
+            elif store is None:
+                raise HTTPError(404, 'Сервис запущен без --store')
+            elif not create and store.shard_path(patient_id) is None:
+                # Опечатка в адресе чтения не должна заводить пациента
+                raise HTTPError(404, f'Нет пациента {patient_id}')
+            else:
+                trackers[patient_id] = store.tracker(patient_id)
+        return trackers[patient_id]
+
+    return get_tracker
+
+
+async def start_server(get_tracker, host='127.0.0.1', port=8765):
+    """Запустить сервис в текущем цикле asyncio; возвращает (server, service)"""
+    service = TrackerService(get_tracker)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    return server, service
+
+
+async def serve(get_tracker, host='127.0.0.1', port=8765):
+    server, service = await start_server(get_tracker, host, port)
+    print(f"🌐 Сервис трекера: http://{host}:{port}/health")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис трекера")
+    parser.add_argument('--data', default='dog_medical_data.db', help='файл данных (один пациент)')
+    parser.add_argument('--store', help='каталог хранилища клиники (/patients/<id>/...)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    store = None
+    if args.store:
+        from patient_store import PatientStore
+        store = PatientStore(args.store)
+    asyncio.run(serve(tracker_factory(args.data, store), args.host, args.port))
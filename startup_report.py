@@ -0,0 +1,65 @@
+# startup_report.py - Сравнение холодного и теплого запуска трекера
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Код дочернего процесса: импорт трекера + load_data, без меню
+CHILD_CODE = """
+import sys, time
+start = time.perf_counter()
+from medical_tracker import DogMedicalTracker
+imported = time.perf_counter()
+tracker = DogMedicalTracker(sys.argv[1])
+loaded = time.perf_counter()
+print(imported - start, loaded - imported, 'matplotlib' in sys.modules)
+"""
+
+
+def run_once(data_file):
+    """Один запуск в отдельном процессе: (полное время, импорт, загрузка, matplotlib)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_CODE, data_file],
+        cwd=here, capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - start
+    import_time, load_time, mpl_loaded = result.stdout.strip().splitlines()[-1].split()
+    return total, float(import_time), float(load_time), mpl_loaded == 'True'
+
+
+def startup_report(data_file, runs=5):
+    data_file = os.path.abspath(data_file)
+    snapshot_path = data_file + '.snapshot.pkl'
+
+    results = {}
+    for mode in ('cold', 'warm'):
+        timings = []
+        for _ in range(runs):
+            # Холодный старт - без снимка, книга разбирается заново
+            if mode == 'cold' and os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            timings.append(run_once(data_file))
+        results[mode] = timings
+
+    print(f"\n⏱️  ОТЧЕТ О ЗАПУСКЕ: {os.path.basename(data_file)} ({runs} запусков)")
+    print("=" * 70)
+    print(f"{'Режим':<8}{'Всего, мс':>14}{'Импорт, мс':>14}{'load_data, мс':>16}{'matplotlib':>14}")
+    for mode, timings in results.items():
+        # Медиана устойчивее к разовым всплескам
+        total, import_time, load_time = (
+            sorted(t[i] for t in timings)[len(timings) // 2] * 1000 for i in range(3)
+        )
+        mpl = 'да' if any(t[3] for t in timings) else 'нет'
+        print(f"{mode:<8}{total:>14.1f}{import_time:>14.1f}{load_time:>16.1f}{mpl:>14}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Холодный и теплый запуск трекера")
+    parser.add_argument('data_file', nargs='?', default='dog_medical_data.xlsx')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    startup_report(args.data_file, args.runs)
@@ -0,0 +1,80 @@
+# status.py - Статусы показателей относительно диапазонов за всю историю
+import numpy as np
+import pandas as pd
+
+from rules import IntervalIndex
+
+# Коды статусов в сетке (int8)
+BELOW = -1
+IN_RANGE = 0
+ABOVE = 1
+MISSING = 2
+
+STATUS_LABELS = {
+    BELOW: 'ниже',
+    IN_RANGE: 'в диапазоне',
+    ABOVE: 'выше',
+    MISSING: 'нет данных',
+}
+
+
+class StatusGrid:
+    """Сетка статусов (даты × показатели), строки в порядке self.df"""
+
+    def __init__(self, dates, metrics, codes):
+        self.dates = dates
+        self.metrics = list(metrics)
+        self.codes = codes
+        self._positions = {metric: i for i, metric in enumerate(self.metrics)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, metric):
+        """Статусы одного показателя по всем датам"""
+        if metric not in self._positions:
+            return np.full(len(self.codes), MISSING, dtype=np.int8)
+        return self.codes[:, self._positions[metric]]
+
+    def columns(self, metrics):
+        """Подсетка для списка показателей (неизвестные - MISSING)"""
+        result = np.full((len(self.codes), len(metrics)), MISSING, dtype=np.int8)
+        for j, metric in enumerate(metrics):
+            if metric in self._positions:
+                result[:, j] = self.codes[:, self._positions[metric]]
+        return result
+
+    def latest(self, metric):
+        """Статус показателя в последнем измерении"""
+        if len(self.codes) == 0:
+            return MISSING
+        return self.column(metric)[-1]
+
+    def to_frame(self):
+        """Сетка в виде DataFrame с текстовыми статусами"""
+        labels = np.vectorize(STATUS_LABELS.get, otypes=[object])(self.codes)
+        return pd.DataFrame(labels, index=self.dates, columns=self.metrics)
+
+
+class StatusEngine:
+    """Оценка значений по диапазонам {показатель: (мин, макс)}
+
+    Каждый диапазон заранее собран в таблицу интервалов (rules.IntervalIndex),
+    поэтому вся история оценивается бинарным поиском по столбцам. Границы
+    включительные, как и в проверках low <= value <= high.
+    """
+
+    def __init__(self, ranges):
+        self.metrics = list(ranges)
+        self.indexes = [IntervalIndex.from_range(*ranges[m]) for m in self.metrics]
+
+    def evaluate(self, df):
+        """Сетка статусов для всей таблицы измерений"""
+        values = df.reindex(columns=self.metrics).to_numpy(dtype=float, na_value=np.nan)
+        codes = np.full(values.shape, MISSING, dtype=np.int8)
+        for j, index in enumerate(self.indexes):
+            # Классы ниже / в диапазоне / выше (0, 1, 2) -> BELOW / IN_RANGE / ABOVE
+            column = index.codes(values[:, j])
+            codes[:, j] = np.where(column >= 0, column - 1, MISSING)
+        dates = df['date'].to_numpy() if 'date' in df.columns else np.arange(len(df))
+        return StatusGrid(dates, self.metrics, codes)
@@ -0,0 +1,246 @@
+# storage.py - Хранилища данных для трекера
+import json
+import os
+import pickle
+import sqlite3
+
+import pandas as pd
+
+
+class Storage:
+    """Базовое хранилище измерений"""
+
+    # True - хранилище умеет дописывать строки, не переписывая историю
+    append_only = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, df, meta=None):
+        """Полная перезапись истории (meta - служебные значения вместе с ней)"""
+        raise NotImplementedError
+
+    def append(self, df, meta=None):
+        """Дописать новые строки (только для append_only хранилищ)"""
+        raise NotImplementedError
+
+    def update(self, df, meta=None):
+        """Исправить сохраненные строки: строки с датами из df заменяются новыми"""
+        history = self.load()
+        history = history[~history['date'].isin(pd.to_datetime(df['date']))]
+        merged = pd.concat([history, df], ignore_index=True)
+        self.save(merged.sort_values('date', kind='stable', ignore_index=True), meta)
+
+    def _save_meta_items(self, meta):
+        for key, value in (meta or {}).items():
+            self.save_meta(key, value)
+
+    # Служебные данные (агрегаты и т.п.) - JSON рядом с файлом данных
+    def _meta_path(self):
+        return self.path + '.meta.json'
+
+    def load_meta(self, key):
+        """Служебное значение по ключу (None, если его нет)"""
+        if not os.path.exists(self._meta_path()):
+            return None
+        try:
+            with open(self._meta_path(), encoding='utf-8') as f:
+                return json.load(f).get(key)
+        except ValueError:
+            return None
+
+    def save_meta(self, key, value):
+        meta = {}
+        if os.path.exists(self._meta_path()):
+            try:
+                with open(self._meta_path(), encoding='utf-8') as f:
+                    meta = json.load(f)
+            except ValueError:
+                meta = {}
+        meta[key] = value
+        tmp_path = f'{self._meta_path()}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path())
+
+
+class ExcelStorage(Storage):
+    """Рабочая книга Excel - каждое сохранение переписывает файл целиком
+
+    Рядом с книгой лежит бинарный снимок (pickle), привязанный к mtime и
+    размеру файла: пока книга не менялась, разбор xlsx пропускается.
+    """
+
+    def __init__(self, path, use_snapshot=True):
+        super().__init__(path)
+        self.use_snapshot = use_snapshot
+        self.snapshot_path = path + '.snapshot.pkl'
+
+    def _file_key(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_snapshot(self):
+        if not self.use_snapshot or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            # Битый снимок просто игнорируем - книга остается источником истины
+            return None
+        if snapshot.get('key') != self._file_key():
+            return None
+        return snapshot['df']
+
+    def _write_snapshot(self, df):
+        if not self.use_snapshot:
+            return
+        tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'key': self._file_key(), 'df': df.reset_index(drop=True)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load(self):
+        df = self._read_snapshot()
+        if df is not None:
+            return df
+        df = pd.read_excel(self.path)
+        df['date'] = pd.to_datetime(df['date'])
+        self._write_snapshot(df)
+        return df
+
+    def save(self, df, meta=None):
+        # Книга пишется во временный файл и подменяется целиком:
+        # сбой посреди записи не портит историю
+        root, ext = os.path.splitext(self.path)
+        tmp_path = f'{root}.tmp{ext}'
+        df.to_excel(tmp_path, index=False)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._write_snapshot(df)
+        self._save_meta_items(meta)
+
+
+class SQLiteStorage(Storage):
+    """SQLite - новое измерение записывается одним INSERT"""
+
+    append_only = True
+    table = 'measurements'
+
+    def __init__(self, path, import_from=None):
+        super().__init__(path)
+        # Сервис обращается к трекеру из своих потоков - по очереди, не одновременно
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL)'
+        )
+        self.conn.execute(
+            f'CREATE INDEX IF NOT EXISTS idx_{self.table}_date ON {self.table} (date)'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+        # Первый запуск: переносим историю из старой рабочей книги
+        if import_from and os.path.exists(import_from) and not self.exists():
+            self.save(ExcelStorage(import_from, use_snapshot=False).load())
+            print(f"📥 История импортирована из {import_from}")
+
+    def close(self):
+        self.conn.close()
+
+    def exists(self):
+        # Пустая база (только что созданная) считается отсутствующей
+        row = self.conn.execute(f'SELECT 1 FROM {self.table} LIMIT 1').fetchone()
+        return row is not None
+
+    def columns(self):
+        rows = self.conn.execute(f'PRAGMA table_info({self.table})').fetchall()
+        return [row[1] for row in rows if row[1] != 'id']
+
+    def _ensure_columns(self, names):
+        """Добавить недостающие столбцы показателей (ALTER TABLE)"""
+        existing = set(self.columns())
+        for name in names:
+            if name in existing:
+                continue
+            if '"' in name:
+                raise ValueError(f"Недопустимое имя показателя: {name}")
+            self.conn.execute(f'ALTER TABLE {self.table} ADD COLUMN "{name}" REAL')
+
+    def _insert(self, df):
+        if len(df) == 0:
+            return
+        columns = list(df.columns)
+        self._ensure_columns(columns)
+
+        values = df.copy()
+        values['date'] = pd.to_datetime(values['date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        values = values.astype(object).where(values.notna(), None)
+
+        names = ', '.join(f'"{name}"' for name in columns)
+        marks = ', '.join('?' for _ in columns)
+        self.conn.executemany(
+            f'INSERT INTO {self.table} ({names}) VALUES ({marks})',
+            values.itertuples(index=False, name=None)
+        )
+
+    def load(self):
+        df = pd.read_sql_query(f'SELECT * FROM {self.table} ORDER BY date, id', self.conn)
+        df = df.drop(columns='id')
+        df['date'] = pd.to_datetime(df['date'])
+        metrics = [col for col in df.columns if col != 'date']
+        df[metrics] = df[metrics].astype(float)
+        return df
+
+    def save(self, df, meta=None):
+        with self.conn:
+            self.conn.execute(f'DELETE FROM {self.table}')
+            self._insert(df)
+            self._put_meta(meta)
+
+    def append(self, df, meta=None):
+        # Строки и служебные значения - в одной транзакции
+        with self.conn:
+            self._insert(df)
+            self._put_meta(meta)
+
+    def update(self, df, meta=None):
+        dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d %H:%M:%S').unique()
+        with self.conn:
+            self.conn.executemany(
+                f'DELETE FROM {self.table} WHERE date = ?', [(date,) for date in dates]
+            )
+            self._insert(df)
+            self._put_meta(meta)
+
+    def load_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_meta(self, key, value):
+        with self.conn:
+            self._put_meta({key: value})
+
+    def _put_meta(self, meta):
+        for key, value in (meta or {}).items():
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+
+
+def open_storage(path, import_from=None):
+    """Выбрать хранилище по расширению файла"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteStorage(path, import_from=import_from)
+    return ExcelStorage(path)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from anomaly import AnomalyDetector, flag_anomalies, rolling_z, score_observations, to_observations
+from benchmark import _reference_ranges, generate_history
+
+
+def _noise_clinic(patients=30, visits=100):
+    ranges = _reference_ranges()
+    return pd.concat([to_observations(generate_history(ranges, visits, seed=i, ckd=False), f'dog-{i}')
+                      for i in range(patients)], ignore_index=True)
+
+
+def test_false_positive_rate_on_noise_is_low():
+    scored = score_observations(_noise_clinic())
+    assert len(flag_anomalies(scored)) / len(scored) < 0.005
+
+
+def test_rolling_z_matches_plain_window():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=40)
+    positions = np.arange(40)
+    expected = []
+    for i, value in enumerate(values):
+        window = values[max(0, i - 20):i]
+        if len(window) < 10:
+            expected.append(np.nan)
+            continue
+        median = np.median(window)
+        expected.append((value - median) / (np.median(np.abs(window - median)) * 1.4826))
+    assert np.allclose(rolling_z(values, positions), expected, equal_nan=True)
+
+
+def test_appended_spike_is_flagged():
+    history = generate_history(_reference_ranges(), 60, seed=3, ckd=False)
+    detector = AnomalyDetector()
+    detector.fit(history)
+
+    last = history['date'].iloc[-1]
+    usual = history[['Potassium']].iloc[[-1]].assign(date=last + pd.Timedelta(days=7))
+    spike = pd.DataFrame({'date': [last + pd.Timedelta(days=14)],
+                          'Potassium': [history['Potassium'].median() * 2]})
+    assert len(detector.score_appended(usual)) == 0
+    anomalies = detector.score_appended(spike)
+    assert list(anomalies['metric']) == ['Potassium']
+    assert 'резкий скачок' in anomalies['reason'].iloc[0]
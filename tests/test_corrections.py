@@ -0,0 +1,34 @@
+import pytest
+
+from medical_tracker import DogMedicalTracker
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = DogMedicalTracker(str(tmp_path / 'dog.db'))
+    tracker.append_measurements([{'date': '2024-01-01', 'Protein_urine': 10.0, 'Creatinine_urine': 100.0}],
+                                verbose=False)
+    return tracker
+
+
+def test_correction_recomputes_derived(tracker):
+    tracker.update_values('2024-01-01', {'Protein_urine': 50})
+    assert tracker.df['UPC_ratio'].iloc[0] == pytest.approx(0.5)
+    reloaded = DogMedicalTracker(tracker.data_file)
+    assert reloaded.df['Protein_urine'].iloc[0] == 50.0
+
+
+@pytest.mark.parametrize('values', [
+    {'Creatinin_typo': 5},
+    {'Protein_urine': 50, 'UPC_ratio': 3},
+    {'Protein_urine': 'abc'},
+])
+def test_invalid_correction_changes_nothing(tracker, values):
+    before = tracker.df.copy()
+    with pytest.raises(ValueError):
+        tracker.update_values('2024-01-01', values)
+
+    assert tracker.df.equals(before)
+    assert 'Creatinin_typo' not in tracker.storage.columns()
+    reloaded = DogMedicalTracker(tracker.data_file)
+    assert reloaded.df['Protein_urine'].iloc[0] == 10.0
@@ -0,0 +1,22 @@
+import os
+
+import pandas as pd
+
+from dashboard import render_dashboard
+
+
+def test_cache_keeps_one_entry_per_patient(tmp_path):
+    cache_dir = str(tmp_path / 'dashboard_cache')
+    output = str(tmp_path / 'out.png')
+    df = pd.DataFrame({'date': pd.to_datetime(['2024-01-01', '2024-02-01']), 'UPC_ratio': [0.4, 0.6]})
+    # Старая запись формата <sha256>.png
+    os.makedirs(cache_dir)
+    open(os.path.join(cache_dir, 'a' * 64 + '.png'), 'wb').close()
+
+    assert render_dashboard(df, output, cache_dir=cache_dir, cache_name='rex.db')
+    assert not render_dashboard(df, output, cache_dir=cache_dir, cache_name='rex.db')
+    changed = pd.concat([df, pd.DataFrame({'date': [pd.Timestamp('2024-03-01')], 'UPC_ratio': [0.8]})])
+    assert render_dashboard(changed, output, cache_dir=cache_dir, cache_name='rex.db')
+    assert render_dashboard(df, output, cache_dir=cache_dir, cache_name='bim.db')
+
+    assert sorted(os.listdir(cache_dir)) == ['bim.db.png', 'bim.db.png.key', 'rex.db.png', 'rex.db.png.key']
@@ -0,0 +1,19 @@
+import os
+
+import pandas as pd
+import pytest
+
+from medical_tracker import DogMedicalTracker
+
+
+def test_export_does_not_overwrite_data_file(tmp_path):
+    data_file = str(tmp_path / 'dog.xlsx')
+    tracker = DogMedicalTracker(data_file)
+    tracker.append_measurements([{'date': '2024-01-01', 'WBC': 10.0}], verbose=False)
+
+    tracker.export_excel()
+    exported = pd.read_excel(str(tmp_path / 'dog_export.xlsx'))
+    assert list(exported['WBC']) == [10.0]
+
+    with pytest.raises(ValueError):
+        tracker.export_excel(os.path.join(str(tmp_path), 'dog.xlsx'))
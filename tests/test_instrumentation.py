@@ -0,0 +1,12 @@
+from instrumentation import profiler
+from medical_tracker import DogMedicalTracker
+
+
+def test_append_counts_journal_bytes(tmp_path):
+    tracker = DogMedicalTracker(str(tmp_path / 'dog.db'))
+    tracker.append_measurements([{'date': '2024-01-01', 'WBC': 10.0}], verbose=False)
+    tracker.append_measurements([{'date': '2024-01-02', 'WBC': 11.0}], verbose=False)
+
+    span = [span for span in profiler.spans if span['name'] == 'append_measurements'][-1]
+    assert span['rows'] == 1
+    assert span['bytes_written'] >= len('{"id": 2, "rows": [{"date": "2024-01-02T00:00:00", "WBC": 11.0}]}\n')
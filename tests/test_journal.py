@@ -0,0 +1,90 @@
+import json
+
+import pandas as pd
+import pytest
+
+from journal import Journal
+from medical_tracker import DogMedicalTracker
+from storage import ExcelStorage, SQLiteStorage
+
+
+@pytest.fixture(params=['xlsx', 'db'])
+def data_file(request, tmp_path):
+    return str(tmp_path / f'dog.{request.param}')
+
+
+def test_invalid_batch_is_not_journaled(data_file):
+    tracker = DogMedicalTracker(data_file)
+    tracker.append_measurements([{'date': '2024-01-01', 'WBC': 10.0}], verbose=False)
+
+    for records in ([{'date': '2024-02-01', 'WBC': 'abc'}],
+                    [{'date': '2024-02-01', 'W"BC': 1.0}],
+                    [{'date': 'не дата', 'WBC': 1.0}],
+                    [{'WBC': 1.0}]):
+        with pytest.raises(ValueError):
+            tracker.append_measurements(records, verbose=False)
+
+    tracker.append_measurements([{'date': '2024-03-01', 'WBC': '12.5'}], verbose=False)
+    reloaded = DogMedicalTracker(data_file)
+    assert list(reloaded.df['WBC'].dropna()) == [10.0, 12.5]
+
+
+def test_corrupt_entry_does_not_block_loading(data_file):
+    tracker = DogMedicalTracker(data_file, checkpoint_every=100)
+    tracker.append_measurements([{'date': '2024-01-01', 'WBC': 10.0}], verbose=False)
+    # Запись, попавшая в журнал в обход проверки
+    with open(tracker.journal.path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 2, 'rows': [{'date': '2024-02-01', 'WBC': 'abc'}]}) + '\n')
+
+    reloaded = DogMedicalTracker(data_file, checkpoint_every=100)
+    assert list(reloaded.df['WBC'].dropna()) == [10.0]
+    reloaded.append_measurements([{'date': '2024-03-01', 'WBC': 11.0}], verbose=False)
+    reloaded.checkpoint()
+
+    with open(reloaded.journal.bad_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+    assert list(DogMedicalTracker(data_file).df['WBC'].dropna()) == [10.0, 11.0]
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    storage = ExcelStorage(str(tmp_path / 'dog.xlsx'))
+    journal = Journal(storage.path + '.journal')
+    journal.append(pd.DataFrame({'date': pd.to_datetime(['2024-01-01']), 'WBC': [1.0]}), storage)
+    with open(journal.path, 'ab') as f:
+        f.write(b'{"id": 2, "rows": [{"da')
+    assert len(journal.pending(storage)) == 1
+    journal.append(pd.DataFrame({'date': pd.to_datetime(['2024-01-02']), 'WBC': [2.0]}), storage)
+    assert list(journal.pending(storage)['WBC']) == [1.0, 2.0]
+
+
+def test_sqlite_checkpoint_marks_entries_applied(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'dog.db'))
+    journal = Journal(storage.path + '.journal')
+    journal.append(pd.DataFrame({'date': pd.to_datetime(['2024-01-01']), 'WBC': [1.0]}), storage)
+    assert journal.checkpoint(storage) == 1
+    assert journal.pending(storage) is None
+    assert list(storage.load()['WBC']) == [1.0]
+
+
+def test_save_data_keeps_visits_of_other_processes(data_file):
+    first = DogMedicalTracker(data_file)
+    second = DogMedicalTracker(data_file)
+    first.append_measurements([{'date': '2024-01-01', 'WBC': 10.0}], verbose=False)
+    second.append_measurements([{'date': '2024-01-02', 'WBC': 11.0}], verbose=False)
+    first.save_data()
+
+    assert list(first.df['WBC'].dropna()) == [10.0, 11.0]
+    assert list(DogMedicalTracker(data_file).df['WBC'].dropna()) == [10.0, 11.0]
+
+
+def test_journaled_values_round_trip_exactly(data_file):
+    value = 1.5 * 88.4  # 132.60000000000002
+    tracker = DogMedicalTracker(data_file)
+    tracker.append_measurements([{'date': '2024-01-01', 'Creatinine_blood': value},
+                                 {'date': '2024-01-02', 'Creatinine_blood': 123.456789012345}],
+                                verbose=False)
+    tracker.save_data()
+
+    expected = [value, 123.456789012345]
+    assert list(tracker.df['Creatinine_blood']) == expected
+    assert list(DogMedicalTracker(data_file).df['Creatinine_blood']) == expected
@@ -0,0 +1,29 @@
+from medical_tracker import DogMedicalTracker
+
+CSV = '''Дата;CREA;K;Комментарий
+03.02.2024;150,5;4,2;ok
+04.02.2024;>300;4.8;
+не дата;120;4.0;
+05.02.2024;н/о;5,1;повтор
+01.02.2024;140;;
+'''
+
+
+def test_csv_round_trip(tmp_path, capsys):
+    path = tmp_path / 'lab.csv'
+    path.write_text(CSV, encoding='utf-8')
+    tracker = DogMedicalTracker(str(tmp_path / 'dog.db'))
+
+    total = tracker.import_lab_file(str(path), chunksize=2, dayfirst=True, sep=';')
+
+    assert total == 4
+    df = DogMedicalTracker(str(tmp_path / 'dog.db')).df
+    assert [d.strftime('%Y-%m-%d') for d in df['date']] == ['2024-02-01', '2024-02-03', '2024-02-04', '2024-02-05']
+    assert df['Creatinine_blood'].tolist()[:2] == [140.0, 150.5]
+    assert df['Creatinine_blood'].iloc[2:].isna().all()
+    assert df['Potassium'].iloc[1:].tolist() == [4.2, 4.8, 5.1]
+
+    out = capsys.readouterr().out
+    assert 'Пропущено строк без даты (или с нечитаемой датой): 1' in out
+    assert "Creatinine_blood: нечисловых значений 2 (например '>300')" in out
+    assert 'Нераспознанные столбцы (не импортированы): Комментарий' in out
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from measurement_store import MeasurementStore
+
+
+def _store():
+    return MeasurementStore.from_frame(pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-02', '2024-01-03']),
+        'a': [1.0, 2.0],
+    }))
+
+
+def test_out_of_order_append_keeps_earlier_frames():
+    store = _store()
+    frame = store.frame()
+    store.append(pd.DataFrame({'date': pd.to_datetime(['2024-01-01']), 'a': [9.0]}))
+
+    assert list(frame['a']) == [1.0, 2.0]
+    assert list(frame['date'].dt.day) == [2, 3]
+    assert list(store.frame()['a']) == [9.0, 1.0, 2.0]
+
+
+def test_set_values_keeps_earlier_frames():
+    store = _store()
+    frame = store.frame()
+    store.set_values([0], 'a', [5.0])
+
+    assert list(frame['a']) == [1.0, 2.0]
+    assert list(store.frame()['a']) == [5.0, 2.0]
+
+
+def test_boundary_values_are_in_range(tmp_path):
+    from medical_tracker import DogMedicalTracker
+    from status import IN_RANGE
+
+    tracker = DogMedicalTracker(str(tmp_path / 'dog.db'))
+    tracker.append_measurements([{'date': '2024-01-01', 'USG': 1.015, 'Troponin': 0.2}], verbose=False)
+    grid = tracker.status_grid()
+    assert grid.latest('USG') == IN_RANGE
+    assert grid.latest('Troponin') == IN_RANGE
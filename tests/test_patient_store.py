@@ -0,0 +1,32 @@
+import sqlite3
+
+import storage
+from patient_store import PatientStore
+
+
+def test_corrections_reindex_without_leaking_connections(tmp_path, monkeypatch):
+    store = PatientStore(str(tmp_path / 'clinic'))
+    tracker = store.tracker('rex')
+    tracker.append_measurements([{'date': '2024-01-01', 'Creatinine_blood': 150.0}], verbose=False)
+
+    opened = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(storage.sqlite3, 'connect', tracking_connect)
+    for value in range(160, 165):
+        tracker.update_values('2024-01-01', {'Creatinine_blood': float(value)})
+    store.reindex('rex')
+
+    still_open = []
+    for conn in opened:
+        try:
+            conn.execute('SELECT 1')
+            still_open.append(conn)
+        except sqlite3.ProgrammingError:
+            pass
+    assert still_open == []
+    assert store.query('Creatinine_blood', '>', 0)['value'].tolist() == [164.0]
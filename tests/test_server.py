@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+from medical_tracker import DogMedicalTracker
+from server import _capture, start_server
+
+
+async def _request(port, raw):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), body
+
+
+def _post(port, payload):
+    body = json.dumps(payload).encode('utf-8')
+    return _request(port, b'POST /measurements HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return DogMedicalTracker(str(tmp_path / 'dog.db'))
+
+
+def test_bad_post_does_not_fail_the_batch(tracker):
+    async def scenario():
+        server, service = await start_server(lambda patient_id, create=False: tracker, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            good = [_post(port, {'date': f'2024-01-{day:02d}', 'WBC': day}) for day in range(1, 11)]
+            bad = [_post(port, {'date': '2024-02-01', 'WBC': 'abc'}),
+                   _post(port, {'date': '2024-02-02', 'Unknown': 1.0})]
+            results = await asyncio.gather(*good, *bad)
+            after = await _post(port, {'date': '2024-03-01', 'WBC': 20})
+            malformed = await _request(port, b'GARBAGE\r\n\r\n')
+            return results, after, malformed
+        finally:
+            server.close()
+            await service.stop()
+
+    results, after, malformed = asyncio.run(scenario())
+    assert [status for status, _ in results] == [201] * 10 + [400, 400]
+    assert after[0] == 201
+    assert malformed[0] == 400
+    assert len(tracker.df) == 11
+    assert 'Unknown' not in tracker.storage.columns()
+
+
+def test_concurrent_reads_capture_their_own_output(tracker):
+    tracker.append_measurements([{'date': '2024-01-01', 'Creatinine_blood': 250, 'UPC_ratio': 1.2}],
+                                verbose=False)
+
+    async def scenario():
+        server, service = await start_server(lambda patient_id, create=False: tracker, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(
+                _request(port, b'GET /analysis/ckd HTTP/1.1\r\n\r\n'),
+                _request(port, b'GET /analysis/proteinuria HTTP/1.1\r\n\r\n'),
+                _request(port, b'GET /tables/key HTTP/1.1\r\n\r\n'),
+            )
+        finally:
+            server.close()
+            await service.stop()
+
+    expected = [_capture(show).encode('utf-8')
+                for show in (tracker.show_ckd_analysis, tracker.show_proteinuria_analysis)]
+    ckd, proteinuria, key = asyncio.run(scenario())
+    assert [ckd[1], proteinuria[1]] == expected
+    assert key[0] == 200
+
+
+def test_reads_do_not_create_patients(tmp_path):
+    from patient_store import PatientStore
+    from server import tracker_factory
+
+    store = PatientStore(str(tmp_path / 'clinic'))
+
+    async def scenario():
+        server, service = await start_server(tracker_factory(str(tmp_path / 'main.db'), store), port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            missing = await _request(port, b'GET /patients/typo123/analysis/ckd HTTP/1.1\r\n\r\n')
+            body = json.dumps({'date': '2024-01-01', 'WBC': 10}).encode('utf-8')
+            created = await _request(port, b'POST /patients/rex/measurements HTTP/1.1\r\n'
+                                           b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+            found = await _request(port, b'GET /patients/rex/analysis/ckd HTTP/1.1\r\n\r\n')
+            return missing, created, found
+        finally:
+            server.close()
+            await service.stop()
+
+    missing, created, found = asyncio.run(scenario())
+    assert [missing[0], created[0], found[0]] == [404, 201, 200]
+    assert list(store.patients()['patient_id']) == ['rex']
+
+
+def test_cache_is_keyed_on_used_parameters_and_bounded(tracker):
+    tracker.append_measurements([{'date': '2024-01-01', 'WBC': 10}], verbose=False)
+
+    async def scenario():
+        server, service = await start_server(lambda patient_id, create=False: tracker, port=0)
+        service.cache_size = 3
+        port = server.sockets[0].getsockname()[1]
+        try:
+            for i in range(5):
+                await _request(port, b'GET /analysis/ckd?x=%d HTTP/1.1\r\n\r\n' % i)
+            sizes = [len(service.cache)]
+            for last in range(1, 6):
+                await _request(port, b'GET /measurements?last=%d HTTP/1.1\r\n\r\n' % last)
+            sizes.append(len(service.cache))
+            return sizes, service.stats['cache_hits']
+        finally:
+            server.close()
+            await service.stop()
+
+    sizes, hits = asyncio.run(scenario())
+    assert sizes == [1, 3]
+    assert hits == 4
@@ -0,0 +1,186 @@
+# trends.py - Инкрементальные тренды показателей ХБП
+import math
+
+import numpy as np
+import pandas as pd
+
+# Показатели, за динамикой которых следим при ХБП
+TREND_METRICS = ('Creatinine_blood', 'SDMA', 'Phosphorus', 'UPC_ratio')
+
+# Время в трендах - дни от этой даты
+EPOCH = pd.Timestamp('2000-01-01')
+
+
+def to_days(dates):
+    """Даты → дни от EPOCH (float)"""
+    return ((pd.to_datetime(dates) - EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=float)
+
+
+class RunningTrend:
+    """Накопленные суммы одного показателя: каждое новое значение - O(1)
+
+    Среднее и дисперсия - по Уэлфорду, наклон - МНК по суммам
+    (t, t², t·y), EWMA - с полураспадом в днях для неравных интервалов.
+    """
+
+    FIELDS = ('count', 'mean', 'm2', 'sum_t', 'sum_tt', 'sum_ty', 'sum_y',
+              'ewma', 'last_t', 'last_value', 'prev_t', 'prev_value')
+
+    def __init__(self, halflife_days):
+        self.halflife_days = halflife_days
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sum_t = 0.0
+        self.sum_tt = 0.0
+        self.sum_ty = 0.0
+        self.sum_y = 0.0
+        self.ewma = math.nan
+        self.last_t = math.nan
+        self.last_value = math.nan
+        self.prev_t = math.nan
+        self.prev_value = math.nan
+
+    def update(self, t, y):
+        self.count += 1
+        delta = y - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (y - self.mean)
+
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_ty += t * y
+        self.sum_y += y
+
+        if self.count == 1:
+            self.ewma = y
+        else:
+            alpha = 1.0 - 0.5 ** (max(t - self.last_t, 0.0) / self.halflife_days)
+            self.ewma += alpha * (y - self.ewma)
+
+        self.prev_t, self.prev_value = self.last_t, self.last_value
+        self.last_t, self.last_value = t, y
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def slope(self):
+        """Наклон линейного тренда, единиц в день"""
+        if self.count < 2:
+            return math.nan
+        s_tt = self.sum_tt - self.sum_t * self.sum_t / self.count
+        if s_tt <= 0:
+            return math.nan
+        s_ty = self.sum_ty - self.sum_t * self.sum_y / self.count
+        return s_ty / s_tt
+
+    @property
+    def rate_of_change(self):
+        """Скорость изменения между двумя последними измерениями, единиц в день"""
+        if self.count < 2 or self.last_t == self.prev_t:
+            return math.nan
+        return (self.last_value - self.prev_value) / (self.last_t - self.prev_t)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data, halflife_days):
+        trend = cls(halflife_days)
+        for field in cls.FIELDS:
+            setattr(trend, field, data[field])
+        return trend
+
+
+class TrendStats:
+    """Тренды по нескольким показателям, синхронизируемые с self.df трекера"""
+
+    def __init__(self, metrics=TREND_METRICS, halflife_days=60):
+        self.metrics = tuple(metrics)
+        self.halflife_days = halflife_days
+        self.reset()
+
+    def reset(self):
+        self.rows = 0
+        self.last_date = None
+        self.trends = {metric: RunningTrend(self.halflife_days) for metric in self.metrics}
+
+    def update(self, df):
+        """Дописать строки (по возрастанию даты после уже учтенных)"""
+        if len(df) == 0:
+            return
+        days = to_days(df['date'])
+        for metric in self.metrics:
+            if metric not in df.columns:
+                continue
+            values = df[metric].to_numpy(dtype=float, na_value=np.nan)
+            trend = self.trends[metric]
+            for t, y in zip(days[~np.isnan(values)], values[~np.isnan(values)]):
+                trend.update(t, y)
+        self.rows += len(df)
+        self.last_date = pd.Timestamp(df['date'].iloc[-1])
+
+    def rebuild(self, df):
+        self.reset()
+        self.update(df)
+
+    def sync(self, df, appended=None):
+        """Привести агрегаты к таблице df; True, если что-то пересчитано
+
+        appended - строки, только что дописанные в конец df: они учитываются
+        за O(1) на значение. Иначе, если сохраненное состояние не совпадает
+        с таблицей, тренды пересчитываются целиком.
+        """
+        if appended is not None and len(appended) > 0:
+            first = pd.Timestamp(appended['date'].iloc[0])
+            if (self.rows + len(appended) == len(df)
+                    and (self.last_date is None or first >= self.last_date)):
+                self.update(appended)
+                return True
+        elif self.rows == len(df):
+            last_date = pd.Timestamp(df['date'].iloc[-1]) if len(df) else None
+            if last_date == self.last_date:
+                return False
+        self.rebuild(df)
+        return True
+
+    def summary(self, metrics=None):
+        """Таблица трендов: среднее, SD, наклон за 30 дней, EWMA, скорость"""
+        rows = []
+        for metric in metrics or self.metrics:
+            trend = self.trends.get(metric)
+            if trend is None or trend.count == 0:
+                continue
+            rows.append({
+                'metric': metric,
+                'count': trend.count,
+                'mean': trend.mean,
+                'std': math.sqrt(trend.variance) if trend.count > 1 else math.nan,
+                'slope_30d': trend.slope * 30,
+                'rate_per_day': trend.rate_of_change,
+                'ewma': trend.ewma,
+                'last': trend.last_value,
+            })
+        return pd.DataFrame(rows).set_index('metric') if rows else pd.DataFrame()
+
+    def to_dict(self):
+        return {
+            'metrics': list(self.metrics),
+            'halflife_days': self.halflife_days,
+            'rows': self.rows,
+            'last_date': self.last_date.isoformat() if self.last_date is not None else None,
+            'trends': {metric: trend.to_dict() for metric, trend in self.trends.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['metrics'], data['halflife_days'])
+        stats.rows = data['rows']
+        stats.last_date = pd.Timestamp(data['last_date']) if data['last_date'] else None
+        stats.trends = {
+            metric: RunningTrend.from_dict(values, stats.halflife_days)
+            for metric, values in data['trends'].items()
+        }
+        return stats